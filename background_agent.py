@@ -4,6 +4,7 @@ import time
 import sys
 import os
 import subprocess
+import threading
 
 def send_notification(title, message):
     """Send Windows 10 toast notification."""
@@ -42,21 +43,23 @@ def main():
         send_notification("Git Gardener - Error", "Gemini API Key is missing! Please configure.")
         sys.exit(1)
     
-    # Notify startup
-    send_notification("Git Gardener Started", "Bot is now monitoring and will commit when idle.")
-    
+    # Only warnings and up (plus events) matter for notifications
+    log_sub = bot.log_bus.subscribe("warning")
     bot.start()
     
+    # Notify startup (PowerShell takes a while, so don't hold up the bot for it)
+    threading.Thread(target=send_notification, daemon=True,
+                     args=("Git Gardener Started", "Bot is now monitoring and will commit when idle.")).start()
+    
     last_count = 0
     
     try:
         while True:
-            # Process the log queue (but don't print to console since we're windowless)
-            while not bot.log_queue.empty():
-                entry = bot.log_queue.get()
+            # Process the log bus (but don't print to console since we're windowless)
+            for entry in log_sub.drain():
                 
                 # Send notifications for important events
-                if "Daily Limit Reached" in entry['message']:
+                if entry.get("event") == "daily_limit":
                     if bot.stats.get_count() != last_count:
                         send_notification("Git Gardener - Daily Limit", 
                                         f"Reached {bot.stats.get_count()} commits today. Bot will resume tomorrow.")
@@ -0,0 +1,660 @@
+"""
+bot_async.py - asyncio engine for GitGardener
+
+An alternative to the thread-per-stage pipeline in bot_core.run_loop:
+Gemini/Ollama are reached through a small asyncio HTTP/1.1 client, git
+runs via asyncio.create_subprocess_exec, and every wait is either an
+event or a cancellable sleep, so stop requests take effect immediately.
+Selected with "engine": "asyncio" in bot_config.json; GitGardener.start,
+stop and log_bus behave exactly as with the threaded engine.
+
+Planning decisions come from GitGardener.next_plan_step/plan_response, the
+same as the threaded planner. Each Ollama slot runs its own coder, so
+speculative generation (speculative_k) is only done by the threaded engine.
+"""
+import os
+import ssl
+import json
+import time
+import asyncio
+import urllib.parse
+
+from bot_core import (FenceStripper, GitManager, gemini_body, ollama_payload, schema_rejected,
+                      usage_tokens)
+from bot_http import STALE_AFTER, HTTPError
+from bot_journal import file_hash
+from bot_scheduler import endpoint_specs
+
+class AsyncResponse:
+    def __init__(self, http, key, reader, writer, status, reason, headers, timeout):
+        self.http = http
+        self.key = key
+        self.reader = reader
+        self.writer = writer
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.timeout = timeout
+        self.finished = False
+
+    async def chunks(self):
+        """Yield the decoded body (Content-Length, chunked or read-to-EOF)."""
+        read = lambda coro: asyncio.wait_for(coro, self.timeout)
+        if self.headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size = int((await read(self.reader.readline())).split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    # Skip trailers up to the terminating blank line
+                    while (await read(self.reader.readline())).strip():
+                        pass
+                    break
+                data = await read(self.reader.readexactly(size))
+                await read(self.reader.readexactly(2))
+                yield data
+        elif "content-length" in self.headers:
+            remaining = int(self.headers["content-length"])
+            while remaining > 0:
+                data = await read(self.reader.read(min(remaining, 65536)))
+                if not data:
+                    raise ConnectionError("connection closed mid-body")
+                remaining -= len(data)
+                yield data
+        else:
+            while True:
+                data = await read(self.reader.read(65536))
+                if not data:
+                    break
+                yield data
+            self.headers["connection"] = "close"
+        self.finished = True
+
+    async def read(self):
+        body = b"".join([data async for data in self.chunks()])
+        self.release()
+        return body
+
+    async def lines(self):
+        buffer = b""
+        async for data in self.chunks():
+            buffer += data
+            while b"\n" in buffer:
+                line, buffer = buffer.split(b"\n", 1)
+                yield line
+        if buffer:
+            yield buffer
+
+    def release(self):
+        reuse = self.finished and self.headers.get("connection", "").lower() != "close"
+        self.http.release(self.key, self.reader, self.writer, reuse)
+
+class AsyncHTTP:
+    """Keep-alive HTTP/1.1 client on asyncio streams (same idle rules as bot_http)."""
+
+    def __init__(self, max_idle=4, idle_timeout=60, stale_after=STALE_AFTER):
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.stale_after = stale_after
+        self.idle = {}
+        self.ssl_context = ssl.create_default_context()
+
+    async def open(self, method, url, body=b"", headers=None, timeout=30):
+        parts = urllib.parse.urlsplit(url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        key = (parts.scheme, parts.hostname, port)
+        path = parts.path or "/"
+        if parts.query:
+            path += f"?{parts.query}"
+        head = [f"{method} {path} HTTP/1.1", f"Host: {parts.hostname}",
+                f"Content-Length: {len(body)}", "Connection: keep-alive"]
+        head += [f"{k}: {v}" for k, v in (headers or {}).items()]
+        request = ("\r\n".join(head) + "\r\n\r\n").encode('utf-8') + body
+
+        while True:
+            reader, writer, idle_for = await self.connect(key, timeout)
+            sent = status_line = False
+            try:
+                writer.write(request)
+                await writer.drain()
+                sent = True
+                status_line = await asyncio.wait_for(reader.readline(), timeout)
+                if not status_line:
+                    raise ConnectionResetError("connection closed before response")
+                _, status, reason = (status_line.decode('latin-1').rstrip("\r\n").split(" ", 2) + [""])[:3]
+                response_headers = {}
+                while True:
+                    line = await asyncio.wait_for(reader.readline(), timeout)
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode('latin-1').partition(":")
+                    response_headers[name.strip().lower()] = value.strip()
+                return AsyncResponse(self, key, reader, writer, int(status), reason,
+                                     response_headers, timeout)
+            except (ConnectionResetError, BrokenPipeError):
+                writer.close()
+                # Same rule as ConnectionPool.open: retry only a request the server can't have seen
+                if idle_for is None or (sent and (status_line or idle_for < self.stale_after)):
+                    raise
+            except BaseException:
+                writer.close()
+                raise
+
+    async def connect(self, key, timeout):
+        """Return (reader, writer, seconds idle), idle being None for a new connection."""
+        now = time.time()
+        stack = self.idle.get(key, [])
+        while stack:
+            reader, writer, last_used = stack.pop()
+            if reader.at_eof() or writer.is_closing() or now - last_used > self.idle_timeout:
+                writer.close()
+                continue
+            return reader, writer, now - last_used
+        scheme, host, port = key
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port, ssl=self.ssl_context if scheme == "https" else None),
+            timeout)
+        return reader, writer, None
+
+    def release(self, key, reader, writer, reuse):
+        stack = self.idle.setdefault(key, [])
+        if reuse and len(stack) < self.max_idle and not writer.is_closing():
+            stack.append((reader, writer, time.time()))
+        else:
+            writer.close()
+
+    async def request(self, method, url, body=b"", headers=None, timeout=30):
+        response = await self.open(method, url, body, headers, timeout)
+        data = await response.read()
+        if not 200 <= response.status < 300:
+            raise HTTPError(response.status, response.reason, data, response.headers)
+        return data
+
+    def close(self):
+        for stack in self.idle.values():
+            for _, writer, _ in stack:
+                writer.close()
+        self.idle.clear()
+
+class AsyncGit:
+    """Git via create_subprocess_exec (no shell), with the same push window as GitManager."""
+
+    def __init__(self, repo_path, logger, config, metrics=None):
+        self.repo_path = repo_path
+        self.logger = logger
+        self.config = config
+        self.metrics = metrics
+        self.branch = "master"
+        self.remote_ready = False
+        self.unpushed = 0
+        self.last_push = time.time()
+
+    async def run(self, *args):
+        proc = await asyncio.create_subprocess_exec(
+            "git", *args, cwd=self.repo_path,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        out, err = await proc.communicate()
+        out, err = out.decode('utf-8', 'replace'), err.decode('utf-8', 'replace')
+        if proc.returncode == 0:
+            return True, out
+        return False, f"STDOUT: {out}\nSTDERR: {err}"
+
+    async def init_repo(self):
+        if not os.path.exists(os.path.join(self.repo_path, ".git")):
+            await self.run("init")
+            await self.run("config", "user.name", self.config.get("name"))
+            await self.run("config", "user.email", self.config.get("email"))
+            self.logger.log("System", "Git Repository Initialized")
+        success, out = await self.run("symbolic-ref", "--short", "HEAD")
+        if success and out.strip():
+            self.branch = out.strip()
+
+    async def commit(self, filename, message):
+        abs_path = os.path.abspath(filename).replace("\\", "/")
+        if not os.path.exists(abs_path):
+            self.logger.log("Error", f"File not found: {abs_path}")
+            return False
+        started = time.time()
+        success, out = await self.run("add", "--force", abs_path)
+        if not success:
+            self.logger.log("Error", f"Git Add Failed: {out}")
+            return False
+        success, out = await self.run("commit", "-m", message)
+        if not success:
+            self.logger.log("Error", f"Commit Failed: {out}")
+            return False
+        elapsed = time.time() - started
+        if self.metrics:
+            self.metrics.observe("git_commit", elapsed)
+        self.unpushed += 1
+        self.logger.log("Git", f"Committed: {message} ({elapsed * 1000:.0f} ms)")
+        return True
+
+    def push_due_in(self):
+        """Seconds until the push window closes, or None if nothing is pending."""
+        if not self.unpushed:
+            return None
+        window = float(self.config.get("git_push_interval", 600))
+        return max(0, self.last_push + window - time.time())
+
+    async def schedule_push(self):
+        if not self.unpushed:
+            return None
+        every = int(self.config.get("git_push_every", 5))
+        if self.unpushed >= every or self.push_due_in() == 0:
+            return await self.push()
+        return None
+
+    async def push(self):
+        started = time.time()
+        self.unpushed = 0
+        self.last_push = started
+        if not self.config.get("repo_url"):
+            return True
+        if not self.remote_ready:
+            await self.run("remote", "add", "origin", self.config.get("repo_url"))
+            self.remote_ready = True
+        await self.run("pull", "--rebase", "origin", self.branch)
+        success, out = await self.run("push", "-u", "origin", self.branch)
+        if success:
+            self.logger.log("Git", "Pushed to remote")
+        else:
+            self.logger.log("Warning", f"Push Failed: {out}")
+        if self.metrics:
+            self.metrics.observe("push", time.time() - started)
+            self.metrics.incr("pushes" if success else "push_failures")
+        return success
+
+class AsyncEngine:
+    def __init__(self, gardener):
+        self.g = gardener
+        self.loop = None
+        self.stop = None
+        self.released = None
+        self.contexts = {}  # (url, model, session) -> Ollama context tokens
+        self.health = {}  # (url, model) -> [failures, resting until], shared by its slots
+        self.plain_models = set()  # models that rejected a response schema
+
+    def run(self):
+        """Run the engine on the calling (GitGardener) thread until stopped."""
+        asyncio.run(self.main())
+
+    def request_stop(self):
+        """Thread-safe: wake the loop so every stage is cancelled at once."""
+        if self.loop and self.stop:
+            self.loop.call_soon_threadsafe(self.stop.set)
+
+    async def main(self):
+        g = self.g
+        self.loop = asyncio.get_running_loop()
+        self.stop = asyncio.Event()
+        self.released = asyncio.Event()
+        self.models_ready = asyncio.Event()
+        if g.stop_event.is_set():
+            return
+
+        self.http = AsyncHTTP(int(g.config.get("http_max_idle", 4)),
+                              float(g.config.get("http_idle_timeout", 60)))
+        self.cache = g.open_cache()
+        self.gemini_url = g.config.get("gemini_url", "https://generativelanguage.googleapis.com/v1beta")
+        self.git = AsyncGit(g.root, g.logger, g.config, g.metrics)
+        tasks = []
+        try:
+            os.makedirs(g.path("output"), exist_ok=True)
+            # Discovery runs beside the pipeline; the planner waits for it
+            tasks.append(asyncio.create_task(self.discover_models()))
+            await self.git.init_repo()
+
+            depth = max(1, int(g.config.get("pipeline_depth", 1)))
+            slots = [(url, model) for url, model, n in endpoint_specs(g.config) for _ in range(n)]
+            self.health = {slot: [0, 0] for slot in slots}
+            self.plan_queue = asyncio.Queue(maxsize=max(depth, len(slots)))
+            self.code_queue = asyncio.Queue(maxsize=depth)
+            g.in_flight = []
+            # Recovery checks are one-off porcelain git calls: run them off the loop
+            recovery_git = GitManager(g.root, g.logger, g.config, g.metrics)
+            resumed = await self.loop.run_in_executor(None, g.resume_jobs, recovery_git)
+            self.git.unpushed += recovery_git.unpushed
+            if resumed:
+                tasks.append(asyncio.create_task(self.feed(resumed)))
+
+            if g.config.get("ollama_warmup", True):
+                tasks += [asyncio.create_task(self.warmup(url, model)) for url, model in set(slots)]
+            tasks.append(asyncio.create_task(self.planner()))
+            tasks += [asyncio.create_task(self.coder(url, model)) for url, model in slots]
+            tasks.append(asyncio.create_task(self.committer()))
+            g.mark_ready("pipeline")
+            await self.stop.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if self.git.unpushed and await self.git.push():
+                g.journal.pushed()
+            self.http.close()
+
+    def release_job(self, job):
+        self.g.release_job(job)
+        self.released.set()
+
+    def drop_job(self, job):
+        self.g.drop_job(job)
+        self.released.set()
+
+    async def feed(self, jobs):
+        for job in jobs:
+            await self.plan_queue.put(job)
+
+    # --- LLM calls ---
+
+    async def discover_models(self):
+        g = self.g
+        g.logger.log("System", "Connecting to Gemini (asyncio engine)...")
+        g.router.set_models(g.rank_models(await self.list_models()))
+        self.models_ready.set()
+        g.mark_ready("models")
+
+    async def list_models(self):
+        key = self.g.config['gemini_key']
+        models_cache = self.g.models_cache()
+        models = models_cache.get(self.gemini_url, key)
+        if models:
+            return models
+        url = f"{self.gemini_url}/models?key={key}"
+        try:
+            data = json.loads((await self.http.request("GET", url, timeout=30)).decode('utf-8'))
+            models = [m['name'] for m in data.get('models', [])
+                      if 'generateContent' in m.get('supportedGenerationMethods', [])]
+            models_cache.put(self.gemini_url, key, models)
+            return models
+        except Exception as e:
+            self.g.logger.log("Error", f"Failed to list models: {e}")
+            return []
+
+    async def gemini(self, prompt, model, cache=True, kind="task", schema=None):
+        if model in self.plain_models:
+            schema = None
+        cache_key = None
+        if cache and self.cache:
+            cache_key = self.cache.key("gemini", model, prompt, {"schema": schema} if schema else None)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+        url = f"{self.gemini_url}/{model}:generateContent?key={self.g.config['gemini_key']}"
+        body = json.dumps(gemini_body(prompt, schema)).encode('utf-8')
+        start = time.time()
+        try:
+            data = await self.http.request("POST", url, body, {'Content-Type': 'application/json'}, timeout=120)
+            result = json.loads(data.decode('utf-8'))
+            if not result.get('candidates'):
+                raise ValueError("response has no candidates")
+            text = result['candidates'][0]['content']['parts'][0]['text']
+        except Exception as e:
+            if schema and schema_rejected(e):
+                self.g.logger.log("Warning", f"{model} rejected the response schema, asking without it")
+                self.plain_models.add(model)
+                return await self.gemini(prompt, model, cache, kind)
+            self.g.logger.log("Error", f"Gemini Request Failed: {e}")
+            self.g.router.record(model, kind, time.time() - start, e)
+            return None
+        self.g.router.record(model, kind, time.time() - start, tokens=usage_tokens(result, prompt, text))
+        if cache_key:
+            self.cache.put(cache_key, text)
+        return text
+
+    async def warmup(self, url, model):
+        """Load a model while Gemini plans the first file."""
+        g = self.g
+        body = json.dumps({"model": model, "prompt": "", "stream": False,
+                           "keep_alive": g.config.get("ollama_keep_alive", "30m")}).encode('utf-8')
+        started = time.time()
+        try:
+            with g.metrics.span("warmup"):
+                await self.http.request("POST", url, body, {'Content-Type': 'application/json'}, timeout=300)
+        except Exception as e:
+            g.logger.log("Warning", f"Ollama warmup of {model} failed: {e}")
+            return
+        g.logger.log("Ollama", f"{model} ready at {url} ({time.time() - started:.1f}s)")
+
+    async def ollama_to_file(self, url, model, prompt, path, session=None, job=None):
+        """Async twin of OllamaClient.generate_to_file (cancel = task cancellation)."""
+        g = self.g
+        reuse_context = session is not None and g.config.get("ollama_reuse_context", False)
+        session_key = (url, model, session)
+        data = ollama_payload(g.config, model, prompt, True,
+                              self.contexts.get(session_key) if reuse_context else None)
+        cache_key = None
+        if self.cache and "context" not in data:
+            cache_key = self.cache.key("ollama-stream", model, prompt,
+                                       {**data["options"], "system": data["system"]})
+            if job is not None:
+                job["cache_key"] = cache_key
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(cached)
+                g.metrics.incr("cache_hits")
+                return cached
+
+        max_tokens = int(g.config.get("ollama_max_tokens", 4096))
+        max_bytes = int(g.config.get("ollama_max_bytes", 200000))
+        stall_timeout = float(g.config.get("ollama_stall_timeout", 120))
+        body = json.dumps(data).encode('utf-8')
+        part_path = path + ".part"
+        stripper = FenceStripper()
+        chunks = []
+        tokens = written = 0
+        started = time.time()
+        response = None
+        try:
+            response = await self.http.open("POST", url, body, {'Content-Type': 'application/json'},
+                                            timeout=stall_timeout)
+            if response.status != 200:
+                raise HTTPError(response.status, response.reason)
+            with open(part_path, "w", encoding="utf-8") as f:
+                done = False
+                async for raw in response.lines():
+                    if not raw.strip():
+                        continue
+                    chunk = json.loads(raw.decode('utf-8'))
+                    if chunk.get("error"):
+                        raise RuntimeError(chunk["error"])
+                    if tokens == 0:
+                        g.metrics.observe("first_token", time.time() - started)
+                    tokens += 1
+                    text = stripper.feed(chunk.get("response", ""))
+                    if text:
+                        f.write(text)
+                        chunks.append(text)
+                        written += len(text)
+                    if tokens > max_tokens or written > max_bytes:
+                        raise OverflowError(f"budget exceeded ({tokens} tokens, {written} bytes)")
+                    if chunk.get("done"):
+                        done = True
+                        context = chunk.get("context")
+                        if reuse_context:
+                            # Same rule as OllamaClient.remember
+                            if context and len(context) < data["options"]["num_ctx"] // 2:
+                                self.contexts[session_key] = context
+                            else:
+                                self.contexts.pop(session_key, None)
+                if not done:
+                    raise RuntimeError("stream ended before completion")
+                text = stripper.close()
+                f.write(text)
+                chunks.append(text)
+            response.release()
+            response = None
+            os.replace(part_path, path)
+            g.metrics.incr("tokens", tokens)
+            g.logger.log("Ollama", f"Streamed {tokens} tokens in {time.time() - started:.1f}s")
+            code = "".join(chunks)
+            if cache_key and code:
+                self.cache.put(cache_key, code)
+            return code
+        except OverflowError as e:
+            g.logger.log("Warning", f"Ollama output discarded: {e}")
+        except Exception as e:
+            g.logger.log("Error", f"Ollama Failed: {e}")
+        finally:
+            if response is not None:
+                response.writer.close()
+            if os.path.exists(part_path):
+                os.remove(part_path)
+        return None
+
+    # --- Stages ---
+
+    async def planner(self):
+        """Same decisions as GitGardener.planner_stage (next_plan_step), awaited."""
+        g = self.g
+        await self.models_ready.wait()
+        while True:
+            try:
+                action = g.next_plan_step()
+                if action[0] == "ask":
+                    request = action[1]
+                    with g.metrics.span(request["span"]):
+                        response = await self.gemini(request["prompt"], request["model"], cache=request["cache"],
+                                                     kind=request["kind"], schema=request["schema"])
+                    action = g.plan_response(request, response)
+                if not action:
+                    continue
+                if action[0] == "job":
+                    await self.queue_task(*action[1])
+                elif action[0] == "full":
+                    # Budget is fully reserved: wake when an in-flight job finishes
+                    self.released.clear()
+                    await self.released.wait()
+                else:
+                    await asyncio.sleep(action[1])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                g.logger.log("CRITICAL", f"Safety Loop Error: {e}")
+                await asyncio.sleep(10)
+
+    async def queue_task(self, project, task):
+        g = self.g
+        job = g.reserve_job(project, task.get("filename", "utils.py"),
+                            task.get("description", "Utility"),
+                            task.get("code_prompt", "Write code"),
+                            task.get("depends_on"))
+        g.logger.log("System", f"Task: Create {job['filename']}")
+        await self.plan_queue.put(job)
+
+    async def coder(self, url, model):
+        g = self.g
+        while True:
+            # Another slot of this endpoint may have put it to rest
+            resting = self.health[(url, model)][1] - time.time()
+            if resting > 0:
+                await asyncio.sleep(resting)
+            job = await self.plan_queue.get()
+            try:
+                if job.pop("resumed", False):
+                    # Its file survived a crash: validate and commit it as it is
+                    g.logger.log("System", f"Resuming {job['filename']} from its written file")
+                    verdict = await self.validate(job)
+                    if verdict == "ok":
+                        await self.code_queue.put(job)
+                        continue
+                    if verdict == "drop":
+                        self.release_job(job)
+                        continue
+                    # "retry": regenerate below with the errors as feedback
+
+                # The detector wakes the executor thread on the idle transition
+                if not await self.loop.run_in_executor(None, g.wait_for_idle):
+                    self.release_job(job)
+                    continue
+
+                g.logger.log("Ollama", f"Coding {job['filename']}...")
+                g.prepare_project_dir(job["project"])
+                rel_path = g.job_path(job)
+                job["model"] = model
+                verdict = "retry"
+                while verdict == "retry":
+                    full_code = g.code_prompt(job)
+                    with g.metrics.span("generation"):
+                        code = await self.ollama_to_file(url, model, full_code, rel_path,
+                                                         job["project"]["folder_name"], job)
+                    if not code:
+                        break
+                    g.log_transcript("Ollama (Coding)", full_code, code)
+                    job["path"] = rel_path
+                    g.journal.record(job["id"], "written", sha256=file_hash(rel_path))
+                    verdict = await self.validate(job)
+                if not code:
+                    g.logger.log("Error", "Ollama produced no code")
+                    g.metrics.incr("ollama_failures")
+                    g.metrics.incr("retries")
+                    self.drop_job(job)
+                    self.endpoint_done(url, model, False)
+                    continue
+                self.endpoint_done(url, model, True)
+                if verdict == "drop":
+                    self.release_job(job)
+                    continue
+                await self.code_queue.put(job)
+            except asyncio.CancelledError:
+                self.release_job(job)
+                raise
+            except Exception as e:
+                g.logger.log("CRITICAL", f"Safety Loop Error: {e}")
+                self.release_job(job)
+                await asyncio.sleep(10)
+
+    def endpoint_done(self, url, model, success):
+        """Endpoint health as OllamaScheduler.release keeps it: a failure rests
+        every slot of the endpoint (5s doubling up to 5 minutes), a success
+        ends the rest."""
+        g = self.g
+        health = self.health[(url, model)]
+        if success:
+            health[:] = [0, 0]
+        else:
+            health[0] += 1
+            backoff = min(300, 5 * 2 ** (health[0] - 1))
+            health[1] = time.time() + backoff
+            g.logger.log("Warning", f"Ollama endpoint {model}@{url} failed, resting for {backoff}s")
+        now = time.time()
+        g.metrics.gauge("ollama_healthy", sum(1 for _, until in self.health.values() if now >= until))
+
+    async def validate(self, job):
+        """Validation runs inline here (regenerating on this slot); the
+        checks themselves still happen in the validator's process pool."""
+        g = self.g
+        if not g.validator:
+            return "ok"
+        with g.metrics.span("validation"):
+            result = await self.loop.run_in_executor(None, g.validator.validate, job["path"])
+        verdict = g.check_validation(job, result)
+        if verdict == "retry":
+            g.logger.log("System", f"Regenerating {job['filename']}")
+        return verdict
+
+    async def committer(self):
+        g = self.g
+        while True:
+            try:
+                # Wake up either for the next file or when the push window closes
+                job = await asyncio.wait_for(self.code_queue.get(), self.git.push_due_in())
+            except asyncio.TimeoutError:
+                if await self.git.schedule_push():
+                    g.journal.pushed()
+                continue
+            try:
+                if await self.git.commit(job["path"], f"feat: {job['description']}"):
+                    g.record_commit(job)
+                    g.journal.record(job["id"], "committed")
+                    if await self.git.schedule_push():
+                        g.journal.pushed()
+                else:
+                    g.metrics.incr("commit_failures")
+                    g.journal.record(job["id"], "dropped")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                g.logger.log("CRITICAL", f"Safety Loop Error: {e}")
+            finally:
+                self.release_job(job)
+            await asyncio.sleep(int(g.config["interval"]))
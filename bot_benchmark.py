@@ -0,0 +1,607 @@
+"""
+bot_benchmark.py - Throughput benchmark for the generate -> commit loop
+
+Runs GitGardener against local stand-ins for the Gemini and Ollama HTTP
+APIs inside a throwaway git repository, then reports files/hour, per-stage
+latency percentiles, subprocess launches and peak RSS.
+
+    python bot_benchmark.py --duration 60 --ollama-tokens 400 --token-rate 40
+    python bot_benchmark.py --scenario speculative-invalid
+    python bot_benchmark.py --crash all --config '{"engine": "asyncio"}'
+    python bot_benchmark.py --http
+
+Every run also checks that no committed .py file has a syntax error and
+exits non-zero if one does, so a validation regression shows up here.
+
+`--crash STEP` tests journal recovery instead: the bot runs in a child
+process that is killed at STEP (a journal step, or "commit" for right
+after git commits), then restarted. It fails if a file was committed
+twice, re-planned under a v2_ name, or an unfinished job was lost.
+
+`--http` checks both HTTP clients against a stub server instead: idle
+connections are reused and evicted, a socket the server closed while idle
+is retried, and a request the server received and dropped is not resent.
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import shutil
+import signal
+import argparse
+import tempfile
+import threading
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Named runs: stub settings and bot_config overrides (--config still wins)
+SCENARIOS = {
+    "speculative-invalid": {
+        "args": {"invalid_rate": 0.5, "duration": 30},
+        "config": {"speculative_k": 3, "speculative_min_headroom": 0,
+                   "ollama_endpoints": [{"concurrency": 3}]},
+    },
+}
+
+class StubSettings:
+    def __init__(self, args):
+        self.gemini_latency = args.gemini_latency
+        self.ollama_latency = args.ollama_latency
+        self.ollama_tokens = args.ollama_tokens
+        self.token_rate = args.token_rate
+        self.failure_rate = args.failure_rate
+        self.invalid_rate = args.invalid_rate
+        self.counter = 0
+        self.calls = {"gemini": 0, "ollama": 0}
+        self.lock = threading.Lock()
+
+    def called(self, backend):
+        with self.lock:
+            self.calls[backend] += 1
+
+    def next_id(self):
+        with self.lock:
+            self.counter += 1
+            return self.counter
+
+    def fail(self):
+        return random.random() < self.failure_rate
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Mimics Gemini `models` / `generateContent` and Ollama `/api/generate`."""
+    protocol_version = "HTTP/1.1"
+    settings = None
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, obj, status=200):
+        body = json.dumps(obj).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_chunk(self, obj):
+        data = (json.dumps(obj) + "\n").encode('utf-8')
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path.startswith("/v1beta/models"):
+            self.send_json({"models": [
+                {"name": "models/gemini-1.5-flash", "supportedGenerationMethods": ["generateContent"]},
+                {"name": "models/gemini-1.5-pro", "supportedGenerationMethods": ["generateContent"]},
+            ]})
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if self.path.startswith("/api/generate"):
+            self.ollama(payload)
+        elif ":generateContent" in self.path:
+            self.gemini(payload)
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+    def gemini(self, payload):
+        s = self.settings
+        s.called("gemini")
+        time.sleep(s.gemini_latency)
+        if s.fail():
+            self.send_json({"error": {"code": 503, "message": "stub failure"}}, 503)
+            return
+        prompt = payload["contents"][0]["parts"][0]["text"]
+        n = s.next_id()
+        plan = re.search(r"Plan the remaining (\d+)", prompt)
+        if "project idea" in prompt:
+            obj = {"project_name": f"Bench Project {n}", "folder_name": f"bench_{n}",
+                   "description": "Synthetic benchmark project"}
+        elif plan:
+            obj = {"files": [{"filename": f"module_{n}_{i}.py", "description": f"module {n}.{i}",
+                              "code_prompt": "Write a small helper module.",
+                              "depends_on": [f"module_{n}_{i - 1}.py"] if i else []}
+                             for i in range(int(plan.group(1)))]}
+        else:
+            obj = {"filename": f"module_{n}.py", "description": f"module {n}",
+                   "code_prompt": "Write a small helper module."}
+        if payload.get("generationConfig", {}).get("responseMimeType") == "application/json":
+            text = json.dumps(obj)
+        else:
+            text = "Here you go:\n```json\n" + json.dumps(obj) + "\n```"
+        self.send_json({"candidates": [{"content": {"parts": [{"text": text}]}}]})
+
+    def ollama(self, payload):
+        s = self.settings
+        time.sleep(s.ollama_latency)
+        if not payload.get("prompt"):  # warmup / model load
+            self.send_json({"model": payload.get("model"), "response": "", "done": True})
+            return
+        s.called("ollama")
+        if s.fail():
+            self.send_json({"error": "stub failure"}, 500)
+            return
+        n = s.next_id()
+        body = [f"def helper_{n}_{i}(x):\n    return x + {i}\n\n" for i in range(s.ollama_tokens)]
+        if random.random() < s.invalid_rate:
+            body[-1] = "def broken(:\n"
+        tokens = ["```python\n"] + body + ["```"]
+        delay = 1.0 / s.token_rate if s.token_rate > 0 else 0
+
+        if not payload.get("stream", True):
+            time.sleep(delay * len(tokens))
+            self.send_json({"response": "".join(tokens), "done": True})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for token in tokens:
+                time.sleep(delay)
+                self.send_chunk({"response": token, "done": False})
+            self.send_chunk({"response": "", "done": True, "context": [1, 2, 3]})
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+class SpawnCounter:
+    """Counts every subprocess launched while the benchmark runs."""
+
+    def __init__(self):
+        self.count = 0
+        self.original = subprocess.Popen
+        counter = self
+
+        class CountingPopen(self.original):
+            def __init__(self, *args, **kwargs):
+                counter.count += 1
+                super().__init__(*args, **kwargs)
+
+        self.popen = CountingPopen
+
+    def __enter__(self):
+        subprocess.Popen = self.popen
+        return self
+
+    def __exit__(self, *exc):
+        subprocess.Popen = self.original
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+class StubServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # Cancelled generations (stop, speculative losers) reset their connection
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+def invalid_committed():
+    """Committed .py files at HEAD that don't compile."""
+    listing = subprocess.run("git ls-tree -r --name-only HEAD", shell=True, capture_output=True, text=True)
+    broken = []
+    for name in listing.stdout.split():
+        if not name.endswith(".py"):
+            continue
+        source = subprocess.run(["git", "show", f"HEAD:{name}"], capture_output=True).stdout
+        try:
+            compile(source, name, "exec")
+        except (SyntaxError, ValueError):
+            broken.append(name)
+    return broken
+
+def start_stubs(args):
+    StubHandler.settings = StubSettings(args)
+    server = StubServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def init_repo(base, args, **overrides):
+    """git init the current directory and write a bot_config.json for the stubs."""
+    subprocess.run("git init -q", shell=True, check=True)
+    subprocess.run("git config user.name bench && git config user.email bench@example.com", shell=True, check=True)
+    config = {
+        "gemini_key": "bench",
+        "gemini_url": f"{base}/v1beta",
+        "ollama_url": f"{base}/api/generate",
+        "interval": args.interval,
+        "max_commits": args.max_commits,
+        "idle_threshold": 101,
+        "llm_cache": False,
+        "metrics_file": "",
+        "repo_url": "",
+    }
+    config.update(SCENARIOS.get(args.scenario, {}).get("config", {}))
+    config.update(overrides)
+    config.update(json.loads(args.config))
+    with open("bot_config.json", "w") as f:
+        json.dump(config, f, indent=2)
+
+def run_benchmark(args):
+    server, base = start_stubs(args)
+    workdir = tempfile.mkdtemp(prefix="gitbot_bench_")
+    old_cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        init_repo(base, args)
+
+        import bot_core
+
+        with SpawnCounter() as spawns:
+            bot = bot_core.GitGardener()
+            started = time.time()
+            bot.start()
+            deadline = started + args.duration
+            while time.time() < deadline and bot.running:
+                if bot.stats.get_count() >= args.max_commits:
+                    break
+                time.sleep(0.1)
+            elapsed = time.time() - started
+            bot.stop()
+            bot.thread.join(30)
+
+        files = bot.stats.get_count()
+        report = {
+            "elapsed_seconds": round(elapsed, 2),
+            "files": files,
+            "files_per_hour": round(files / elapsed * 3600, 1) if elapsed else 0.0,
+            "subprocesses": spawns.count,
+            "peak_rss_mb": peak_rss_mb(),
+            "invalid_committed": invalid_committed() if files else [],
+        }
+        snapshot = bot.metrics.snapshot()
+        report["stages"] = snapshot["stages"]
+        report["counters"] = snapshot["counters"]
+        return report
+    finally:
+        os.chdir(old_cwd)
+        server.shutdown()
+        if args.keep:
+            print(f"Benchmark repo kept at {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+CRASH_STEPS = ("planned", "written", "commit", "committed")
+CRASH_EXIT = 17
+
+def crash_child(step, target, duration):
+    """Run the bot in this process (cwd is the test repo) until `target`
+    files are committed, exiting abruptly when it reaches `step`. Without
+    a step (the restart) it runs until the jobs the journal had unfinished
+    are committed or dropped."""
+    import bot_core
+    bot = bot_core.GitGardener()
+    record = bot.journal.record
+
+    def unfinished():
+        return {j["id"] for j in bot.journal.pending() if j["step"] != "committed"}
+    # The bot only loads the journal once running, so read the file itself
+    waiting = {i for i, j in journal_jobs().items() if j["step"] not in ("committed", "pushed", "dropped")}
+
+    def dying_record(job_id, name, **fields):
+        record(job_id, name, **fields)
+        if name == step:
+            os._exit(CRASH_EXIT)
+    bot.journal.record = dying_record
+
+    if step == "commit":
+        from bot_async import AsyncGit
+        commit, async_commit = bot_core.GitManager.commit, AsyncGit.commit
+
+        def dying_commit(self, *args):
+            commit(self, *args)
+            os._exit(CRASH_EXIT)
+
+        async def dying_async_commit(self, *args):
+            await async_commit(self, *args)
+            os._exit(CRASH_EXIT)
+        bot_core.GitManager.commit, AsyncGit.commit = dying_commit, dying_async_commit
+
+    bot.start()
+    deadline = time.time() + duration
+    while time.time() < deadline and bot.running and bot.stats.get_count() < target:
+        # Resumed jobs are in the journal's pending set once the pipeline runs
+        if not step and "startup_pipeline_seconds" in bot.metrics.gauges and not waiting & unfinished():
+            break
+        time.sleep(0.1)
+    bot.stop()
+    bot.thread.join(30)
+
+def run_child(args, step, target):
+    cmd = [sys.executable, os.path.abspath(__file__), "--crash-child", step,
+           "--crash-target", str(target), "--duration", str(args.duration)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    try:
+        return proc.wait(args.duration + 60)
+    except subprocess.TimeoutExpired:
+        return None
+    finally:
+        # A process killed mid-spawn can leave children that never exec'd
+        if hasattr(os, "killpg"):
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except OSError:
+                pass
+
+def journal_jobs(path="jobs.journal"):
+    """id -> merged fields of every job in a raw journal file."""
+    jobs = {}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                jobs.setdefault(record["id"], {}).update(record)
+    return jobs
+
+def git_files(*args):
+    return subprocess.run(["git", *args], capture_output=True, text=True).stdout.split()
+
+def run_crash(args, step):
+    server, base = start_stubs(args)
+    workdir = tempfile.mkdtemp(prefix="gitbot_crash_")
+    old_cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        init_repo(base, args)
+        first = run_child(args, step, args.max_commits)
+        calls = dict(StubHandler.settings.calls)
+        jobs = journal_jobs()
+        unfinished = {i: f"output/projects/{j['project']}/{j['filename']}"
+                      for i, j in jobs.items() if j["step"] not in ("pushed", "dropped") and j.get("filename")}
+        head = set(git_files("ls-tree", "-r", "--name-only", "HEAD"))
+        # Written files that never reached a commit should be reused, not regenerated
+        reusable = sum(1 for i, p in unfinished.items() if jobs[i]["step"] == "written" and p not in head)
+
+        second = run_child(args, "", args.max_commits)
+        jobs = journal_jobs()
+        head = set(git_files("ls-tree", "-r", "--name-only", "HEAD"))
+        history = git_files("log", "--name-only", "--format=")
+        with open("debug.log", "r", encoding="utf-8", errors="replace") as f:
+            resumed = sum(1 for line in f if "Resuming" in line and "from its written file" in line)
+        report = {
+            "step": step,
+            "crashed": first == CRASH_EXIT,
+            "restart_exit": second,
+            "unfinished": len(unfinished),
+            "reusable": reusable,
+            "resumed_from_file": resumed,
+            "duplicates": sorted({f for f in history if history.count(f) > 1}),
+            "renamed": sorted(f for f in head if os.path.basename(f).startswith("v2_")),
+            # Finished under its own journal id: a re-planned copy would redo the LLM work
+            "lost": sorted(p for i, p in unfinished.items() if jobs[i]["step"] != "dropped"
+                           and (p not in head or jobs[i]["step"] not in ("committed", "pushed"))),
+            "calls_after_restart": {k: v - calls[k] for k, v in StubHandler.settings.calls.items()},
+        }
+        report["ok"] = (report["crashed"] and second == 0 and not report["duplicates"]
+                        and not report["renamed"] and not report["lost"] and resumed >= reusable)
+        return report
+    finally:
+        os.chdir(old_cwd)
+        server.shutdown()
+        if args.keep:
+            print(f"Crash test repo kept at {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+class PoolHandler(BaseHTTPRequestHandler):
+    """Counts connections and requests; /close hangs up after answering, /drop without answering."""
+    protocol_version = "HTTP/1.1"
+    counts = {}
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def setup(self):
+        super().setup()
+        self.count("connections")
+
+    def do_GET(self):
+        self.count(self.path)
+        if self.path == "/drop":
+            self.close_connection = True
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+        # No "Connection: close": the client keeps a socket the server has closed
+        self.close_connection = self.path == "/close"
+
+def http_steps(call, idle_timeout, stale_after):
+    """Drive one client through the pool checks; `call(path)` does one GET."""
+    counts = PoolHandler.counts
+
+    def delta(before):
+        return {k: v - before.get(k, 0) for k, v in counts.items() if v != before.get(k, 0)}
+
+    results = []
+    before = dict(counts)
+    call("/ok")
+    call("/ok")
+    results.append(("reuse", delta(before) == {"connections": 1, "/ok": 2}, delta(before)))
+
+    time.sleep(idle_timeout + 0.1)
+    before = dict(counts)
+    call("/ok")
+    results.append(("idle eviction", delta(before) == {"connections": 1, "/ok": 1}, delta(before)))
+
+    call("/close")
+    time.sleep(stale_after + 0.1)
+    before = dict(counts)
+    try:
+        call("/ok")
+        ok = delta(before) == {"connections": 1, "/ok": 1}
+    except Exception as e:
+        ok = False
+        before["error"] = repr(e)
+    results.append(("stale retry", ok, before.get("error") or delta(before)))
+
+    call("/ok")
+    before = dict(counts)
+    try:
+        call("/drop")
+        ok = False
+    except (ConnectionResetError, BrokenPipeError, ConnectionAbortedError):
+        ok = delta(before) == {"/drop": 1}
+    results.append(("no resend", ok, delta(before)))
+    return results
+
+def run_http_check():
+    """Check both HTTP clients against PoolHandler: reuse, idle eviction, stale-socket retry,
+    and that a request the server received and dropped is not sent again."""
+    import asyncio
+    from bot_async import AsyncHTTP
+    from bot_http import ConnectionPool
+
+    server = StubServer(("127.0.0.1", 0), PoolHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    idle_timeout, stale_after = 0.5, 0.2
+    report = {}
+    try:
+        pool = ConnectionPool(idle_timeout=idle_timeout, stale_after=stale_after)
+        report["threads"] = http_steps(lambda path: pool.request("GET", base + path, timeout=5),
+                                       idle_timeout, stale_after)
+        pool.close()
+
+        loop = asyncio.new_event_loop()
+        client = AsyncHTTP(idle_timeout=idle_timeout, stale_after=stale_after)
+        report["asyncio"] = http_steps(
+            lambda path: loop.run_until_complete(client.request("GET", base + path, timeout=5)),
+            idle_timeout, stale_after)
+        client.close()
+        loop.close()
+    finally:
+        server.shutdown()
+    return report
+
+def print_http(report):
+    for engine, results in report.items():
+        for name, ok, detail in results:
+            print(f"{engine:<8} {name:<14} {'ok' if ok else 'FAIL'}  {detail}")
+
+def print_crash(report):
+    problems = [f"{name}: {', '.join(report[name])}" for name in ("duplicates", "renamed", "lost") if report[name]]
+    if not report["crashed"]:
+        problems.append(f"never reached {report['step']}")
+    if report["resumed_from_file"] < report["reusable"]:
+        problems.append(f"regenerated {report['reusable'] - report['resumed_from_file']} written files")
+    if report["restart_exit"] != 0:
+        problems.append(f"restart exited with {report['restart_exit']}")
+    calls = report["calls_after_restart"]
+    print(f"{report['step']:<10} {'ok' if report['ok'] else 'FAIL':<5} {report['unfinished']} unfinished, "
+          f"{report['resumed_from_file']} resumed from file, {calls['gemini']} Gemini / "
+          f"{calls['ollama']} Ollama calls after restart" + "".join(f"; {p}" for p in problems))
+
+def print_report(report):
+    print(f"Files:         {report['files']} in {report['elapsed_seconds']}s")
+    print(f"Throughput:    {report['files_per_hour']} files/hour")
+    print(f"Subprocesses:  {report['subprocesses']}")
+    if report["peak_rss_mb"] is not None:
+        print(f"Peak RSS:      {report['peak_rss_mb']:.1f} MB")
+    if report["invalid_committed"]:
+        print(f"INVALID:       {', '.join(report['invalid_committed'])} committed with syntax errors")
+    print(f"{'stage':<12}{'count':>7}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}")
+    for stage, s in sorted(report["stages"].items()):
+        print(f"{stage:<12}{s['count']:>7}{s['p50']:>10.3f}{s['p90']:>10.3f}{s['p99']:>10.3f}{s['max']:>10.3f}")
+    for name, value in sorted(report["counters"].items()):
+        print(f"{name + ':':<15}{value}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the GitGardener loop against local LLM stubs")
+    parser.add_argument("--duration", type=float, default=60, help="max seconds to run")
+    parser.add_argument("--max-commits", type=int, default=20, help="stop after this many files")
+    parser.add_argument("--interval", type=int, default=0, help="bot interval between commits")
+    parser.add_argument("--gemini-latency", type=float, default=0.5, help="seconds per Gemini call")
+    parser.add_argument("--ollama-latency", type=float, default=1.0, help="seconds to first Ollama token")
+    parser.add_argument("--ollama-tokens", type=int, default=50, help="tokens per generated file")
+    parser.add_argument("--token-rate", type=float, default=100, help="Ollama tokens per second")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of stub calls that fail")
+    parser.add_argument("--invalid-rate", type=float, default=0.0, help="fraction of Ollama files with a syntax error")
+    parser.add_argument("--config", default="{}", help="JSON overrides for bot_config.json")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), help="preset run (see SCENARIOS)")
+    parser.add_argument("--crash", choices=CRASH_STEPS + ("all",), help="kill the bot at this step and check the restart")
+    parser.add_argument("--http", action="store_true", help="check the HTTP connection pools against a stub server")
+    parser.add_argument("--crash-child", help=argparse.SUPPRESS)
+    parser.add_argument("--crash-target", type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary repository")
+    args = parser.parse_args(argv)
+    if args.scenario:  # the preset only changes defaults, explicit flags still win
+        parser.set_defaults(**SCENARIOS[args.scenario]["args"])
+        args = parser.parse_args(argv)
+
+    if args.crash_child is not None:
+        crash_child(args.crash_child, args.crash_target, args.duration)
+        return 0
+    if args.http:
+        report = run_http_check()
+        if args.json:
+            print(json.dumps(report, indent=2))
+        else:
+            print_http(report)
+        return 0 if all(ok for results in report.values() for _, ok, _ in results) else 1
+    if args.crash:
+        reports = [run_crash(args, step) for step in (CRASH_STEPS if args.crash == "all" else (args.crash,))]
+        if args.json:
+            print(json.dumps(reports, indent=2))
+        else:
+            for report in reports:
+                print_crash(report)
+        return 0 if all(r["ok"] for r in reports) else 1
+
+    report = run_benchmark(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 1 if report["invalid_committed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""
+bot_cache.py - Content-addressed on-disk cache for LLM responses
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+class ResponseCache:
+    """Stores one JSON file per (backend, model, prompt, options) hash.
+
+    Entries expire `ttl` seconds after they were written. When the total
+    size exceeds `max_bytes`, the least recently used entries are removed
+    (file mtime is bumped on every hit so the order survives restarts).
+    """
+
+    def __init__(self, directory=".llm_cache", max_bytes=200 * 1024 * 1024, ttl=7 * 86400):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    @staticmethod
+    def key(backend, model, prompt, options=None):
+        raw = json.dumps([backend, model, prompt, options or {}], sort_keys=True)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _scan(self):
+        found = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            found.append((st.st_mtime, name[:-5], st.st_size))
+        for _, key, size in sorted(found):
+            self.entries[key] = size
+            self.size += size
+        self._evict()
+
+    def _drop(self, key):
+        self.size -= self.entries.pop(key, 0)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        while self.size > self.max_bytes and self.entries:
+            self._drop(next(iter(self.entries)))
+
+    def get(self, key):
+        """Return the cached response text, or None on a miss or expiry."""
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            path = self._path(key)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                self._drop(key)
+                self.misses += 1
+                return None
+            if time.time() - entry.get("created", 0) > self.ttl:
+                self._drop(key)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            self.hits += 1
+            return entry.get("response")
+
+    def discard(self, key):
+        """Forget an entry, e.g. a response that turned out to be unusable."""
+        with self.lock:
+            if key in self.entries:
+                self._drop(key)
+
+    def put(self, key, response):
+        data = json.dumps({"created": time.time(), "response": response})
+        size = len(data.encode('utf-8'))
+        path = self._path(key)
+        with self.lock:
+            try:
+                tmp = f"{path}.tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    f.write(data)
+                os.replace(tmp, path)
+            except OSError:
+                return
+            self.size += size - self.entries.pop(key, 0)
+            self.entries[key] = size
+            self._evict()
@@ -0,0 +1,99 @@
+"""
+bot_cli.py - Headless entry point (no Tk, nothing loaded before it is needed)
+
+    python -m bot_cli run [--config bot_config.json] [--root .] [--level info]
+    python -m bot_cli supervise [bot_supervisor.json]
+    python -m bot_cli startup [--config bot_config.json] [--root .]
+
+`startup` measures how quickly the agent becomes resident: time to import
+the core, to construct the gardener, until the pipeline threads run and
+until the Gemini model list is known. It runs with a daily limit of zero,
+so nothing is generated or committed while measuring.
+"""
+import sys
+import time
+import argparse
+
+LAUNCHED = time.perf_counter()
+
+def print_entry(entry):
+    source = f"{entry['source']} " if entry.get("source") else ""
+    print(f"[{entry['time']}] {source}{entry['role']}: {entry['message']}", flush=True)
+
+def run(args):
+    from bot_core import GitGardener
+    bot = GitGardener(args.config, args.root)
+    if not bot.config.get("gemini_key"):
+        print("Gemini API key is missing; set gemini_key in " + args.config, file=sys.stderr)
+        return 1
+    sub = bot.log_bus.subscribe(args.level)
+    bot.start()
+    try:
+        while bot.running:
+            sub.wait(1)
+            for entry in sub.drain():
+                print_entry(entry)
+    except KeyboardInterrupt:
+        bot.stop()
+        if bot.thread:
+            bot.thread.join()
+    return 0
+
+def supervise(args):
+    from bot_supervisor import main
+    main([args.file] if args.file else [])
+    return 0
+
+def startup(args):
+    timings = [("launch", LAUNCHED)]
+    import bot_core
+    timings.append(("import", time.perf_counter()))
+    bot = bot_core.GitGardener(args.config, args.root)
+    bot.config = {**bot.config, "max_commits": 0}
+    timings.append(("construct", time.perf_counter()))
+
+    sub = bot.log_bus.subscribe("info", backlog=False)
+    pending = {"pipeline_ready", "models_ready"}
+    bot.start()
+    deadline = time.monotonic() + args.timeout
+    while pending and time.monotonic() < deadline:
+        sub.wait(0.1)
+        for entry in sub.drain():
+            if entry.get("event") in pending:
+                pending.discard(entry["event"])
+                timings.append((entry["event"].replace("_ready", ""), time.perf_counter()))
+    bot.stop()
+    if bot.thread:
+        bot.thread.join(timeout=10)
+
+    for (_, previous), (name, at) in zip(timings, timings[1:]):
+        print(f"{name:<10} +{at - previous:7.3f}s   {at - LAUNCHED:7.3f}s total")
+    for event in sorted(pending):
+        print(f"{event.replace('_ready', ''):<10} not ready after {args.timeout:.0f}s")
+    return 1 if pending else 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="bot_cli", description="Git Gardener without the GUI")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("run", help="run the bot and print its log")
+    p.add_argument("--config", default="bot_config.json")
+    p.add_argument("--root", default=".")
+    p.add_argument("--level", default="info", help="lowest log level printed")
+    p.set_defaults(func=run)
+
+    p = commands.add_parser("supervise", help="serve the repositories of a supervisor file")
+    p.add_argument("file", nargs="?")
+    p.set_defaults(func=supervise)
+
+    p = commands.add_parser("startup", help="measure the time until the agent is resident")
+    p.add_argument("--config", default="bot_config.json")
+    p.add_argument("--root", default=".")
+    p.add_argument("--timeout", type=float, default=30)
+    p.set_defaults(func=startup)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
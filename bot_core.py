@@ -5,12 +5,29 @@ import os
 import json
 import time
 import datetime
+import hashlib
 import subprocess
-import urllib.request
-import urllib.error
+import socket
 import threading
 import queue
 import re
+import uuid
+
+from bot_cache import ResponseCache
+from bot_http import ConnectionPool, HTTPError
+from bot_idle import IdleDetector
+from bot_journal import JobJournal, file_hash
+from bot_json import extract
+from bot_logbus import FileSink, LogBus
+from bot_metrics import Metrics, MetricsExporter
+from bot_quota import QuotaManager
+from bot_router import ModelListCache, ModelRouter
+from bot_scheduler import OllamaScheduler
+from bot_state import ProjectStore
+from bot_symbols import compact, summarize
+from bot_stats import DailyStats
+from bot_transcript import TranscriptStore
+from bot_validate import Validator
 
 # --- CONFIGURATION ---
 DEFAULT_CONFIG = {
@@ -18,85 +35,483 @@ DEFAULT_CONFIG = {
     "model": "qwen2.5-coder:7b",
     "interval": 60,
     "max_commits": 20,
+    "pipeline_depth": 1,
+    "concurrent_projects": 1,
+    "journal_file": "jobs.journal",
+    "projects_keep_completed": 50,
+    "speculative_k": 1,
+    "speculative_min_headroom": 50,
+    "speculative_temperatures": [0.2, 0.7, 1.0],
+    "batch_planning": True,
+    "structured_output": True,
+    "plan_context_tokens": 300,
+    "code_context_tokens": 600,
+    "gemini_url": "https://generativelanguage.googleapis.com/v1beta",
+    "gemini_models_file": "gemini_models.json",
+    "gemini_models_ttl": 86400,
+    "gemini_quota_file": "gemini_quota.json",
+    "gemini_quotas": {"default": {"rpm": 15, "tpm": 1000000, "rpd": 1500}},
+    "ollama_url": "http://localhost:11434/api/generate",
+    "ollama_stream": True,
+    "ollama_max_tokens": 4096,
+    "ollama_max_bytes": 200000,
+    "ollama_stall_timeout": 120,
+    "ollama_keep_alive": "30m",
+    "ollama_num_ctx": 8192,
+    "ollama_warmup": True,
+    "ollama_reuse_context": False,
+    "validate": True,
+    "validate_workers": 2,
+    "validate_retries": 1,
+    "validate_strict_imports": False,
+    "http_max_idle": 4,
+    "http_idle_timeout": 60,
+    "llm_cache": True,
+    "llm_cache_dir": ".llm_cache",
+    "llm_cache_max_mb": 200,
+    "llm_cache_ttl": 604800,
+    "git_batch": True,
+    "git_push_every": 5,
+    "git_push_interval": 600,
+    "metrics_file": "metrics.json",
+    "metrics_interval": 30,
+    "metrics_port": 0,
+    "log_capacity": 2000,
+    "log_file": "debug.log",
+    "log_file_level": "info",
+    "ollama_endpoints": [],
+    "engine": "threads",
+    "idle_hysteresis": 10,
+    "idle_smoothing": 0.3,
+    "idle_sample_interval": 2,
+    "idle_min_free_memory": 10,
+    "transcript_dir": "transcripts",
+    "transcript_segment_mb": 10,
+    "transcript_compress": "gzip",
     "repo_url": "",
     "name": "GitBot",
     "email": "bot@example.com"
 }
 
+PRIORITY_ORDER = [
+    "models/gemini-1.5-flash",
+    "models/gemini-1.5-flash-latest",
+    "models/gemini-1.5-pro",
+    "models/gemini-1.5-pro-latest",
+    "models/gemini-1.0-pro"
+]
+
+IDEA_PROMPT = (
+    "Generate a unique, intermediate-level Python project idea. "
+    "It should be a valid, real-world tool or utility. "
+    "Return JSON: {project_name, folder_name, description}"
+)
+
+FILES_PER_PROJECT = 5
+
+# Response schemas (Gemini responseSchema format), also used to validate replies
+STRING = {"type": "STRING"}
+IDEA_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {"project_name": STRING, "folder_name": STRING, "description": STRING},
+    "required": ["project_name", "folder_name", "description"],
+}
+TASK_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {"filename": STRING, "description": STRING, "code_prompt": STRING},
+    "required": ["filename", "description", "code_prompt"],
+}
+PLAN_FILE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {**TASK_SCHEMA["properties"], "depends_on": {"type": "ARRAY", "items": STRING}},
+    "required": ["filename", "description", "code_prompt"],
+}
+PLAN_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {"files": {"type": "ARRAY", "items": PLAN_FILE_SCHEMA}},
+    "required": ["files"],
+}
+
+def usage_tokens(result, prompt, text):
+    """Total tokens of a generateContent call, estimated if not reported."""
+    usage = result.get("usageMetadata") or {}
+    return usage.get("totalTokenCount") or (len(prompt) + len(text)) // 4
+
+def gemini_body(prompt, schema=None):
+    """generateContent request; with a schema Gemini answers in JSON mode."""
+    data = {"contents": [{"parts": [{"text": prompt}]}]}
+    if schema:
+        data["generationConfig"] = {"responseMimeType": "application/json", "responseSchema": schema}
+    return data
+
+def schema_rejected(error):
+    """True if a failed request was a 400 about JSON mode itself (older
+    models), not a bad key or a bad request."""
+    if getattr(error, "status", None) != 400:
+        return False
+    body = getattr(error, "body", b"") or b""
+    if isinstance(body, bytes):
+        body = body.decode('utf-8', 'replace')
+    return any(field in body for field in ("responseSchema", "response_schema",
+                                           "responseMimeType", "response_mime_type"))
+
 class Logger:
-    def __init__(self, log_queue):
-        self.queue = log_queue
+    def __init__(self, bus, source=None):
+        self.bus = bus
+        self.source = source  # repo name when several gardeners share a bus
 
-    def log(self, role, message):
+    def log(self, role, message, event=None):
         ts = datetime.datetime.now().strftime("%H:%M:%S")
-        self.queue.put({"role": role, "message": message, "time": ts})
+        self.bus.publish({"role": role, "message": message, "time": ts, "event": event,
+                          "source": self.source})
 
 class GeminiClient:
     BASE_URL = "https://generativelanguage.googleapis.com/v1beta"
+    MODELS_TTL = 3600
 
-    def __init__(self, api_key, logger):
+    def __init__(self, api_key, logger, pool=None, cache=None, base_url=None,
+                 router=None, models_cache=None):
         self.api_key = api_key
+        self.base_url = base_url or self.BASE_URL
         self.logger = logger
+        self.pool = pool or ConnectionPool()
+        self.cache = cache
+        self.router = router
+        self.models_cache = models_cache
+        self.models = None
+        self.models_fetched = 0
+        self.plain_models = set()  # models that rejected a response schema
 
     def list_models(self):
-        url = f"{self.BASE_URL}/models?key={self.api_key}"
+        if self.models and time.time() - self.models_fetched < self.MODELS_TTL:
+            return self.models
+        if self.models_cache:
+            models = self.models_cache.get(self.base_url, self.api_key)
+            if models:
+                self.models, self.models_fetched = models, time.time()
+                return models
+        url = f"{self.base_url}/models?key={self.api_key}"
         try:
-            with urllib.request.urlopen(url, timeout=30) as response:
-                data = json.loads(response.read().decode('utf-8'))
-                return [m['name'] for m in data.get('models', []) 
-                       if 'generateContent' in m.get('supportedGenerationMethods', [])]
+            data = json.loads(self.pool.request("GET", url, timeout=30).decode('utf-8'))
+            self.models = [m['name'] for m in data.get('models', [])
+                           if 'generateContent' in m.get('supportedGenerationMethods', [])]
+            self.models_fetched = time.time()
+            if self.models_cache:
+                self.models_cache.put(self.base_url, self.api_key, self.models)
+            return self.models
         except Exception as e:
             self.logger.log("Error", f"Failed to list models: {e}")
             return []
 
-    def generate_content(self, prompt, model="models/gemini-1.5-flash"):
-        url = f"{self.BASE_URL}/{model}:generateContent?key={self.api_key}"
+    def generate_content(self, prompt, model="models/gemini-1.5-flash", cache=True, kind="task",
+                         schema=None):
+        url = f"{self.base_url}/{model}:generateContent?key={self.api_key}"
         headers = {'Content-Type': 'application/json'}
-        data = {"contents": [{"parts": [{"text": prompt}]}]}
+        if model in self.plain_models:
+            schema = None
+        data = gemini_body(prompt, schema)
+
+        cache_key = None
+        if cache and self.cache:
+            cache_key = self.cache.key("gemini", model, prompt, {"schema": schema} if schema else None)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
         
+        start = time.time()
         try:
-            req = urllib.request.Request(url, data=json.dumps(data).encode('utf-8'), headers=headers)
-            with urllib.request.urlopen(req, timeout=120) as response:
-                result = json.loads(response.read().decode('utf-8'))
-                if 'candidates' in result and result['candidates']:
-                    return result['candidates'][0]['content']['parts'][0]['text']
+            body = self.pool.request("POST", url, json.dumps(data).encode('utf-8'), headers, timeout=120)
+            result = json.loads(body.decode('utf-8'))
+            if not result.get('candidates'):
+                raise ValueError("response has no candidates")
+            text = result['candidates'][0]['content']['parts'][0]['text']
         except Exception as e:
+            if schema and schema_rejected(e):
+                # Older models have no JSON mode; the prompt still asks for JSON
+                self.logger.log("Warning", f"{model} rejected the response schema, asking without it")
+                self.plain_models.add(model)
+                return self.generate_content(prompt, model, cache, kind)
             self.logger.log("Error", f"Gemini Request Failed: {e}")
-        return None
+            if self.router:
+                self.router.record(model, kind, time.time() - start, e)
+            return None
+        if self.router:
+            self.router.record(model, kind, time.time() - start, tokens=usage_tokens(result, prompt, text))
+        if cache_key:
+            self.cache.put(cache_key, text)
+        return text
+
+class FenceStripper:
+    """Incrementally removes the markdown code fence around streamed code.
+
+    Lines are emitted as soon as they are known not to be the closing fence;
+    fence-only and blank lines are held back until more content follows.
+    """
+    OPEN_FENCE = re.compile(r"^\s*`{3,}[a-zA-Z]*\s*$")
+    CLOSE_FENCE = re.compile(r"^\s*`{3,}\s*$")
+
+    def __init__(self):
+        self.started = False
+        self.line = ""
+        self.held = ""
+
+    def feed(self, text):
+        out = []
+        self.line += text
+        while "\n" in self.line:
+            line, self.line = self.line.split("\n", 1)
+            out.append(self._line(line))
+        return "".join(out)
+
+    def close(self):
+        tail, self.line = self.line, ""
+        if not tail.strip() or self.CLOSE_FENCE.match(tail):
+            return ""
+        if not self.started and self.OPEN_FENCE.match(tail):
+            return ""
+        out = self.held + tail + "\n"
+        self.held = ""
+        return out
+
+    def _line(self, line):
+        if not self.started:
+            if not line.strip():
+                return ""
+            self.started = True
+            if self.OPEN_FENCE.match(line):
+                return ""
+        if not line.strip() or self.CLOSE_FENCE.match(line):
+            self.held += line + "\n"
+            return ""
+        out = self.held + line + "\n"
+        self.held = ""
+        return out
+
+OLLAMA_SYSTEM = "You write complete, working Python modules. Reply with code only."
+
+def ollama_payload(config, model, prompt, stream, context=None, options=None):
+    """Request body for /api/generate shared by both engines.
+
+    The fixed system prompt and the project-first prompt layout give Ollama
+    a stable prefix to reuse from its KV cache; `keep_alive` keeps the model
+    loaded between commits. `options` (temperature, seed...) are merged
+    into the model options.
+    """
+    data = {
+        "model": model,
+        "prompt": prompt,
+        "stream": stream,
+        "system": config.get("ollama_system", OLLAMA_SYSTEM),
+        "keep_alive": config.get("ollama_keep_alive", "30m"),
+        "options": {"num_ctx": int(config.get("ollama_num_ctx", 8192)), **(options or {})},
+    }
+    if context:
+        data["context"] = context
+    return data
 
 class OllamaClient:
-    def __init__(self, model, logger):
+    def __init__(self, model, logger, config=None, pool=None, cache=None):
         self.model = model
         self.logger = logger
-        self.url = "http://localhost:11434/api/generate"
-
-    def generate(self, prompt):
-        data = {
-            "model": self.model,
-            "prompt": prompt,
-            "stream": False,
-             "options": {"num_ctx": 8192}
-        }
+        self.config = config or {}
+        self.pool = pool or ConnectionPool()
+        self.cache = cache
+        self.url = self.config.get("ollama_url", "http://localhost:11434/api/generate")
+        self.active_conn = None
+        self.cancelled = False
+        self.last_stats = {}
+        self.last_key = None  # cache entry of the last generation, to drop it if the code is bad
+        self.contexts = {}  # session -> context tokens of its last reply
+
+    def payload(self, prompt, stream, session=None, options=None):
+        context = None
+        if session is not None and self.config.get("ollama_reuse_context", False):
+            context = self.contexts.get(session)
+        return ollama_payload(self.config, self.model, prompt, stream, context, options)
+
+    def cache_key(self, backend, data):
+        # Replies that continue a conversation depend on more than the prompt
+        if not self.cache or "context" in data:
+            return None
+        return self.cache.key(backend, self.model, data["prompt"], {**data["options"], "system": data["system"]})
+
+    def remember(self, session, context):
+        """Keep the reply's context for the session's next request, until it
+        fills half the context window (then the session starts over)."""
+        if session is None or not self.config.get("ollama_reuse_context", False):
+            return
+        if context and len(context) < int(self.config.get("ollama_num_ctx", 8192)) // 2:
+            self.contexts[session] = context
+        else:
+            self.contexts.pop(session, None)
+
+    def warmup(self):
+        """Load the model ahead of the first job; returns seconds taken or None."""
+        data = {"model": self.model, "prompt": "", "stream": False,
+                "keep_alive": self.config.get("ollama_keep_alive", "30m")}
+        started = time.time()
         try:
-            req = urllib.request.Request(
-                self.url, 
-                data=json.dumps(data).encode('utf-8'),
-                headers={'Content-Type': 'application/json'}
-            )
-            with urllib.request.urlopen(req, timeout=300) as response:
-                result = json.loads(response.read().decode('utf-8'))
-                return result.get("response", "")
+            self.pool.request("POST", self.url, json.dumps(data).encode('utf-8'),
+                              {'Content-Type': 'application/json'}, timeout=300)
+        except Exception as e:
+            self.logger.log("Warning", f"Ollama warmup of {self.model} failed: {e}")
+            return None
+        return time.time() - started
+
+    def generate(self, prompt, session=None):
+        data = self.payload(prompt, False, session)
+        cache_key = self.last_key = self.cache_key("ollama", data)
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+        try:
+            body = self.pool.request("POST", self.url, json.dumps(data).encode('utf-8'),
+                                     {'Content-Type': 'application/json'}, timeout=300)
+            result = json.loads(body.decode('utf-8'))
+            text = result.get("response", "")
+            self.remember(session, result.get("context"))
+            if cache_key and text:
+                self.cache.put(cache_key, text)
+            return text
         except Exception as e:
             self.logger.log("Error", f"Ollama Failed: {e}")
             return None
 
+    def generate_to_file(self, prompt, path, stop_event=None, session=None, options=None):
+        """Stream a generation straight into `path`, stripping code fences.
+
+        Chunks are written as they arrive to `path + ".part"`, which is renamed
+        into place only when the model finishes. Returns the written code, or
+        None if the request failed, was cancelled or exceeded its budget.
+        """
+        max_tokens = int(self.config.get("ollama_max_tokens", 4096))
+        max_bytes = int(self.config.get("ollama_max_bytes", 200000))
+        stall_timeout = float(self.config.get("ollama_stall_timeout", 120))
+
+        data = self.payload(prompt, True, session, options)
+        # Cached value is the fence-stripped code, hence the separate backend tag
+        cache_key = self.last_key = self.cache_key("ollama-stream", data)
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(cached)
+                self.last_stats = {"first_token": 0, "duration": 0, "tokens": 0,
+                                   "bytes": len(cached), "cached": True}
+                return cached
+        part_path = path + ".part"
+        stripper = FenceStripper()
+        chunks = []
+        tokens = 0
+        written = 0
+        first_token = None
+        started = time.time()
+        conn = None
+        reuse = False
+        self.cancelled = False
+        try:
+            conn, response = self.pool.open("POST", self.url, json.dumps(data).encode('utf-8'),
+                                            {'Content-Type': 'application/json'}, timeout=stall_timeout,
+                                            on_connect=self.track)
+            if response.status != 200:
+                raise HTTPError(response.status, response.reason)
+
+            with open(part_path, "w", encoding="utf-8") as f:
+                done = False
+                for raw in response:
+                    if stop_event is not None and stop_event.is_set():
+                        raise InterruptedError("cancelled")
+                    if not raw.strip():
+                        continue
+                    chunk = json.loads(raw.decode('utf-8'))
+                    if chunk.get("error"):
+                        raise RuntimeError(chunk["error"])
+                    piece = chunk.get("response", "")
+                    if piece and first_token is None:
+                        first_token = time.time() - started
+                    tokens += 1
+                    text = stripper.feed(piece)
+                    if text:
+                        f.write(text)
+                        chunks.append(text)
+                        written += len(text)
+                    if tokens > max_tokens or written > max_bytes:
+                        raise OverflowError(f"budget exceeded ({tokens} tokens, {written} bytes)")
+                    if chunk.get("done"):
+                        done = True
+                        self.remember(session, chunk.get("context"))
+                        break
+                if not done:
+                    raise RuntimeError("stream ended before completion")
+                text = stripper.close()
+                f.write(text)
+                chunks.append(text)
+
+            # Drain the chunked terminator so the socket can be reused
+            response.read()
+            reuse = not response.will_close
+            os.replace(part_path, path)
+            self.last_stats = {
+                "first_token": first_token,
+                "duration": time.time() - started,
+                "tokens": tokens,
+                "bytes": written,
+            }
+            code = "".join(chunks)
+            if cache_key and code:
+                self.cache.put(cache_key, code)
+            return code
+        except InterruptedError:
+            self.logger.log("System", "Ollama generation cancelled")
+        except OverflowError as e:
+            self.logger.log("Warning", f"Ollama output discarded: {e}")
+        except Exception as e:
+            if stop_event is not None and stop_event.is_set():
+                self.logger.log("System", "Ollama generation cancelled")
+            else:
+                self.logger.log("Error", f"Ollama Failed: {e}")
+        finally:
+            self.active_conn = None
+            if conn is not None:
+                self.pool.release(conn, reuse)
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        return None
+
+    def track(self, conn):
+        self.active_conn = conn
+        # A stop may have been requested while the connection was being set up
+        if self.cancelled:
+            raise InterruptedError("cancelled")
+
+    def cancel(self):
+        """Abort an in-flight streaming request from another thread."""
+        self.cancelled = True
+        conn = self.active_conn
+        if conn is not None and conn.sock is not None:
+            try:
+                conn.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
 class GitManager:
-    def __init__(self, repo_path, logger, config):
+    def __init__(self, repo_path, logger, config, metrics=None):
         self.repo_path = repo_path
         self.logger = logger
         self.config = config
+        self.metrics = metrics
+        self.importer = None
+        self.importer_mark = 0
+        self.branch_exists = False
+        self.branch = None
+        self.remote_ready = False
+        self.unpushed = 0
+        self.last_push = time.time()
+        self.stats = {"commits": 0, "commit_seconds": 0.0, "pushes": 0, "spawns": 0}
 
     def run(self, cmd):
+        self.stats["spawns"] += 1
         try:
             result = subprocess.run(
                 cmd, shell=True, check=True, cwd=self.repo_path,
@@ -114,6 +529,8 @@ class GitManager:
             self.run(f'git config user.name "{self.config.get("name")}"')
             self.run(f'git config user.email "{self.config.get("email")}"')
             self.logger.log("System", "Git Repository Initialized")
+        success, out = self.run("git symbolic-ref --short HEAD")
+        self.branch = out.strip() if success and out.strip() else "master"
 
     def commit(self, filename, message):
         # Resolve to absolute path to avoid CWD ambiguity
@@ -126,67 +543,246 @@ class GitManager:
              self.logger.log("Error", f"File not found: {abs_path}")
              return False
 
+        started = time.time()
+        if self.config.get("git_batch", True):
+            success = self.commit_batched(abs_path, message)
+        else:
+            success = self.commit_porcelain(abs_path, message)
+        if success:
+            elapsed = time.time() - started
+            self.stats["commits"] += 1
+            self.stats["commit_seconds"] += elapsed
+            if self.metrics:
+                self.metrics.observe("git_commit", elapsed)
+            self.unpushed += 1
+            self.logger.log("Git", f"Committed: {message} ({elapsed * 1000:.0f} ms)")
+        return success
+
+    def commit_porcelain(self, abs_path, message):
         success_add, out_add = self.run(f'git add --force --verbose "{abs_path}"')
         if not success_add:
              self.logger.log("Error", f"Git Add Failed: {out_add}")
              return False
              
         success, out = self.run(f'git commit -m "{message}"')
-        if success:
-            self.logger.log("Git", f"Committed: {message}")
-            return True
-        else:
+        if not success:
             self.logger.log("Error", f"Commit Failed: {out}")
+        return success
+
+    def start_importer(self):
+        self.stats["spawns"] += 1
+        self.importer = subprocess.Popen(
+            ["git", "fast-import", "--quiet"], cwd=self.repo_path,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        self.importer_mark = 0
+        # A fresh repo has no branch tip to build on yet
+        success, _ = self.run(f"git rev-parse --verify --quiet refs/heads/{self.branch}")
+        self.branch_exists = success
+
+    def stop_importer(self):
+        if self.importer is None:
+            return
+        try:
+            self.importer.stdin.write(b"done\n")
+            self.importer.stdin.close()
+            self.importer.wait(timeout=30)
+        except Exception:
+            self.importer.kill()
+        self.importer = None
+
+    def commit_batched(self, abs_path, message):
+        """Commit one file through a long-lived `git fast-import` process.
+
+        Every commit names the branch tip on disk as its parent, so commits
+        made meanwhile by other processes (GUI, instant_committer, the user)
+        are built on rather than overwritten. A checkpoint writes the ref and
+        get-mark returns the new commit; if the ref didn't end up there (lost
+        a race with another committer) the file is committed via porcelain
+        git instead. The index entry is updated so `git status` stays clean.
+        """
+        rel_path = os.path.relpath(abs_path, os.path.abspath(self.repo_path)).replace("\\", "/")
+        with open(abs_path, "rb") as f:
+            content = f.read()
+        msg = message.encode('utf-8')
+        name = self.config.get("name", "GitBot")
+        email = self.config.get("email", "bot@example.com")
+        offset = time.strftime("%z") or "+0000"
+
+        try:
+            if self.importer is None or self.importer.poll() is not None:
+                self.start_importer()
+            self.importer_mark += 1
+            mark = self.importer_mark
+            stream = [
+                f"commit refs/heads/{self.branch}\n".encode('utf-8'),
+                f"mark :{mark}\n".encode('utf-8'),
+                f"committer {name} <{email}> {int(time.time())} {offset}\n".encode('utf-8'),
+                f"data {len(msg)}\n".encode('utf-8'), msg, b"\n",
+            ]
+            if self.branch_exists:
+                # ^0 makes fast-import read the ref from disk, not its own branch table
+                stream.append(f"from refs/heads/{self.branch}^0\n".encode('utf-8'))
+            stream += [
+                f"M 100644 inline {rel_path}\n".encode('utf-8'),
+                f"data {len(content)}\n".encode('utf-8'), content, b"\n\n",
+                b"checkpoint\n\n",
+                f"get-mark :{mark}\n".encode('utf-8'),
+            ]
+            self.importer.stdin.write(b"".join(stream))
+            self.importer.stdin.flush()
+            sha = self.importer.stdout.readline().decode('utf-8').strip()
+        except Exception as e:
+            self.logger.log("Error", f"Commit Failed: {e}")
+            self.stop_importer()
+            return False
+
+        if not sha:
+            err = self.importer.stderr.read().decode('utf-8', 'replace')
+            self.importer = None
+            self.logger.log("Error", f"Commit Failed: {err}")
             return False
 
+        blob = hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+        success, tip = self.run(f'git update-index --add --cacheinfo 100644,{blob},"{rel_path}" '
+                                f'&& git rev-parse refs/heads/{self.branch}')
+        if success and tip.strip() == sha:
+            self.branch_exists = True
+            return True
+        # Another commit moved the branch between fast-import reading and updating it
+        self.logger.log("Warning", f"Branch moved during fast-import commit, retrying {rel_path} with git commit")
+        self.stop_importer()
+        return self.commit_porcelain(abs_path, message)
+
+    def committed(self, filename):
+        """True if HEAD holds `filename` with exactly its current content."""
+        rel_path = os.path.relpath(os.path.abspath(filename), os.path.abspath(self.repo_path)).replace("\\", "/")
+        ok_head, head = self.run(f'git rev-parse "HEAD:{rel_path}"')
+        ok_file, blob = self.run(f'git hash-object "{rel_path}"')
+        return ok_head and ok_file and head.strip() == blob.strip()
+
+    def sync_index(self, filenames):
+        """Point the index entries of `filenames` back at HEAD if they differ.
+
+        fast-import moves the branch without touching the index, which
+        commit_batched updates afterwards; a crash in between leaves the
+        committed files looking staged for deletion or as older versions.
+        """
+        root = os.path.abspath(self.repo_path)
+        paths = " ".join(f'"{os.path.relpath(os.path.abspath(f), root)}"'.replace("\\", "/") for f in filenames)
+        same, _ = self.run(f"git diff-index --cached --quiet HEAD -- {paths}")
+        if not same:
+            self.run(f"git reset -q -- {paths}")
+
+    def schedule_push(self):
+        """Push once `git_push_every` commits or `git_push_interval` seconds have
+        accumulated; returns push()'s result, or None if it wasn't time yet."""
+        if not self.unpushed:
+            return None
+        every = int(self.config.get("git_push_every", 5))
+        window = float(self.config.get("git_push_interval", 600))
+        if self.unpushed >= every or time.time() - self.last_push >= window:
+            return self.push()
+        return None
+
     def push(self):
+        """Push pending commits; True on success or when there is no remote."""
+        started = time.time()
+        # Hand the branch back to porcelain git (the index is already current)
+        if self.importer is not None:
+            self.stop_importer()
+
+        self.unpushed = 0
+        self.last_push = time.time()
         if self.config.get("repo_url"):
-            self.run(f'git remote add origin {self.config.get("repo_url")}')
+            if not self.remote_ready:
+                self.run(f'git remote add origin {self.config.get("repo_url")}')
+                self.remote_ready = True
             # Pull changes first to avoid conflicts/rejection
-            self.run("git pull --rebase origin master")
+            self.run(f"git pull --rebase origin {self.branch}")
             
-            success, out = self.run("git push -u origin master")
+            success, out = self.run(f"git push -u origin {self.branch}")
             if success:
+                self.stats["pushes"] += 1
                 self.logger.log("Git", "Pushed to remote")
             else:
                 self.logger.log("Warning", f"Push Failed: {out}")
+            if self.metrics:
+                self.metrics.observe("push", time.time() - started)
+                self.metrics.incr("pushes" if success else "push_failures")
+            return success
+        return True
 
-class DailyStats:
-    def __init__(self, filename="daily_stats.json"):
-        self.filename = filename
+def rank_models(all_models):
+    """Order Gemini models for the router: PRIORITY_ORDER, other flash models, the rest."""
+    candidates = [m for m in PRIORITY_ORDER if m in all_models]
+    other_flash = [m for m in all_models if 'flash' in m.lower() and m not in candidates]
+    other_flash.sort(reverse=True)
+    candidates.extend(other_flash)
+    candidates.extend([m for m in all_models if m not in candidates])
+    if not candidates: candidates = ["models/gemini-1.5-flash"]
+    return candidates
 
-    def get_count(self):
-        today = datetime.datetime.now().strftime("%Y-%m-%d")
-        if os.path.exists(self.filename):
-            try:
-                with open(self.filename, "r") as f:
-                    data = json.load(f)
-                    if data.get("date") == today:
-                        return data.get("count", 0)
-            except: pass
-        return 0
-
-    def increment(self):
-        today = datetime.datetime.now().strftime("%Y-%m-%d")
-        count = self.get_count() + 1
-        with open(self.filename, "w") as f:
-            json.dump({"date": today, "count": count}, f)
-        return count
+def open_cache(config):
+    if not config.get("llm_cache", True):
+        return None
+    return ResponseCache(config.get("llm_cache_dir", ".llm_cache"),
+                         int(config.get("llm_cache_max_mb", 200)) * 1024 * 1024,
+                         float(config.get("llm_cache_ttl", 7 * 86400)))
 
 class GitGardener:
-    def __init__(self, config_file="bot_config.json"):
+    def __init__(self, config_file="bot_config.json", root=".", shared=None, config=None):
+        """`root` is the repository this gardener works in; `shared` (see
+        bot_supervisor.SharedResources) supplies the clients, cache, idle
+        detector and scheduler when several gardeners run in one process."""
         self.config_file = config_file
-        self.config = self.load_config()
-        self.stats = DailyStats()
-        self.log_queue = queue.Queue()
-        self.logger = Logger(self.log_queue)
+        self.config = {**DEFAULT_CONFIG, **config} if config is not None else self.load_config()
+        self.root = root
+        self.shared = shared
+        self.stats = DailyStats(self.path("daily_stats.db"), self.path("daily_stats.json"))
+        if shared:
+            self.log_bus = shared.log_bus
+            self.logger = Logger(self.log_bus, os.path.basename(os.path.abspath(root)))
+            self.log_sink = None
+            self.metrics = shared.metrics
+        else:
+            self.log_bus = LogBus(int(self.config.get("log_capacity", 2000)))
+            self.logger = Logger(self.log_bus)
+            self.log_sink = None
+            if self.config.get("log_file", "debug.log"):
+                self.log_sink = FileSink(self.log_bus, self.path(self.config.get("log_file", "debug.log")),
+                                         self.config.get("log_file_level", "info"))
+            self.metrics = Metrics()
+        self.exporter = None
+        self.idle = None
+        self.transcripts = None
+        self.validator = None
+        self.cache = None
+        self.replanning = set()  # folders whose next plan must not come from the cache
+        self.limit_reached = False  # "Daily Limit Reached" is logged once per stretch
         
         self.running = False
         self.thread = None
+        self.started_at = None
         self.stop_event = threading.Event()
+        self.state_lock = threading.Lock()
+        self.projects = ProjectStore(self.path("projects.json"), self.path("current_project.json"),
+                                     self.logger, int(self.config.get("projects_keep_completed", 50))).load()
+        journal_file = self.config.get("journal_file", "jobs.journal")
+        # Loaded (and locked) by run_loop, so a UI building the bot doesn't touch it
+        self.journal = JobJournal(self.path(journal_file) if journal_file else None)
+        self.in_flight = []
         
+        if shared:
+            self.pool = shared.pool
+            self.router = shared.router
+        else:
+            self.pool = ConnectionPool(int(self.config.get("http_max_idle", 4)),
+                                       float(self.config.get("http_idle_timeout", 60)))
+            self.router = ModelRouter(self.logger, self.metrics, self.quota_manager())
         self.gemini = None
-        self.ollama = None
+        self.scheduler = None
+        self.engine = None
         self.git = None
 
     def load_config(self):
@@ -197,13 +793,21 @@ class GitGardener:
 
     def save_config(self, new_config):
         self.config = {**self.config, **new_config}
+        if not self.config_file:
+            return
         with open(self.config_file, "w") as f:
             json.dump(self.config, f, indent=2)
 
+    def path(self, *parts):
+        return os.path.join(self.root, *parts)
+
     def start(self):
         if self.running: return
         self.running = True
+        self.started_at = time.perf_counter()
         self.stop_event.clear()
+        if self.log_sink:
+            self.log_sink.start()
         self.thread = threading.Thread(target=self.run_loop, daemon=True)
         self.thread.start()
         self.logger.log("System", "Bot Started (V4 Core)")
@@ -212,254 +816,941 @@ class GitGardener:
         if not self.running: return
         self.logger.log("System", "Stopping...")
         self.stop_event.set()
+        # A shared scheduler also serves other gardeners; ours notice stop_event
+        if self.scheduler and not self.shared:
+            self.scheduler.cancel_all()
+        if self.engine:
+            self.engine.request_stop()
         self.running = False
 
     def log_transcript(self, actor, input_text, output_text):
-        """Append detailed interaction to a markdown transcript."""
-        try:
-            with open("conversation_transcript.md", "a", encoding="utf-8") as f:
-                ts = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                f.write(f"\n## {ts} - {actor}\n")
-                f.write(f"**Input/Prompt:**\n```\n{input_text.strip()}\n```\n")
-                f.write(f"**Output/Response:**\n```\n{output_text.strip()}\n```\n")
-                f.write("-" * 40 + "\n")
-        except: pass
+        """Queue a detailed interaction for the transcript store."""
+        if self.transcripts:
+            self.transcripts.record(actor, input_text, output_text)
 
     def is_system_idle(self):
         """Check if system CPU usage is low enough to start heavy tasks."""
+        # Fallback to True without a detector (don't block bot forever)
+        return self.idle.is_idle() if self.idle else True
+
+    def wait_for_idle(self):
+        """Block until the idle detector reports idle; False if stopping."""
+        if not self.idle:
+            return not self.stop_event.is_set()
+        with self.metrics.span("idle_wait"):
+            return self.idle.wait_idle(self.stop_event)
+
+    def warmup(self, client):
+        """Load a model while Gemini plans the first file."""
+        with self.metrics.span("warmup"):
+            seconds = client.warmup()
+        if seconds is not None:
+            self.logger.log("Ollama", f"{client.model} ready at {client.url} ({seconds:.1f}s)")
+
+    def wait(self, seconds):
+        """Sleep up to `seconds`, returning True early if a stop was requested."""
+        return self.stop_event.wait(seconds)
+
+    def put_stage(self, stage_queue, item):
+        """Hand an item to the next stage, giving up if the bot is stopping."""
+        while not self.stop_event.is_set():
+            try:
+                stage_queue.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get_stage(self, stage_queue):
+        """Take the next item from a stage queue, or None on timeout."""
         try:
-            # wmic is a reliable zero-dep way to get CPU load on Windows
-            cmd = "wmic cpu get loadpercentage /value"
-            res = subprocess.check_output(cmd, shell=True, encoding='utf-8')
-            match = re.search(r"LoadPercentage=(\d+)", res)
-            if match:
-                load = int(match.group(1))
-                threshold = int(self.config.get("idle_threshold", 40))
-                is_idle = load < threshold
-                if not is_idle:
-                    self.logger.log("System", f"System Busy ({load}% CPU). Waiting for idle...")
-                return is_idle
-        except Exception as e:
-            # Fallback to True if check fails (don't block bot forever)
-            return True
-        return True
+            return stage_queue.get(timeout=1)
+        except queue.Empty:
+            return None
+
+    def release_job(self, job):
+        """Drop a job from the in-flight set (committed, failed or abandoned)."""
+        with self.state_lock:
+            if job in self.in_flight:
+                self.in_flight.remove(job)
+            self.metrics.gauge("in_flight", len(self.in_flight))
+
+    def drop_job(self, job):
+        """Release a job that won't be committed, so it isn't resumed either."""
+        self.journal.record(job["id"], "dropped")
+        self.release_job(job)
+
+    def resume_jobs(self, git):
+        """Jobs the journal shows unfinished, re-registered as in flight.
+
+        A job whose file is on disk with the journaled hash skips Ollama
+        (marked "resumed"); one whose file already reached HEAD only gets
+        its bookkeeping; the rest are coded again from their planned
+        prompt. Committed jobs just wait for the next push. Resumed jobs
+        count against the daily limit like new ones; those over it stay in
+        the journal for a later run.
+        """
+        entries = self.journal.pending()
+        if not entries:
+            return []
+        folders = {p["folder_name"]: p for p in self.projects.history()}
+        jobs = []
+        landed = []  # written files a commit reached before the crash
+        deferred = 0
+        for entry in entries:
+            project = folders.get(entry.get("project"))
+            if project is None or entry.get("filename") is None:
+                self.journal.record(entry["id"], "dropped")
+                continue
+            if entry["step"] == "committed":
+                git.unpushed += 1
+                continue
+            job = {"id": entry["id"], "project": project, "filename": entry["filename"],
+                   "description": entry["description"], "code_prompt": entry["code_prompt"],
+                   "depends_on": entry.get("depends_on", [])}
+            path = self.job_path(job)
+            if entry["step"] == "written" and entry.get("sha256") == file_hash(path):
+                job["path"] = path
+                if git.committed(path):
+                    # Died between the commit and the bookkeeping
+                    if job["filename"] not in project.get("files", []):
+                        self.record_commit(job)
+                    self.journal.record(job["id"], "committed")
+                    git.unpushed += 1
+                    landed.append(path)
+                    continue
+                job["resumed"] = True
+            elif job["filename"] in project.get("files", []):
+                self.journal.record(job["id"], "committed")
+                git.unpushed += 1
+                continue
+            with self.state_lock:
+                if self.stats.get_count() + len(self.in_flight) >= int(self.config.get("max_commits", 20)):
+                    deferred += 1
+                    continue
+                self.in_flight.append(job)
+            jobs.append(job)
+        if landed:
+            git.sync_index(landed)
+        if deferred:
+            self.logger.log("System", f"Daily limit reached, {deferred} journaled jobs wait for a later run")
+        if not jobs:
+            return []
+        self.logger.log("System", f"Resuming {len(jobs)} unfinished jobs from the journal")
+        self.metrics.incr("jobs_resumed", len(jobs))
+        return jobs
+
+    def pending_files(self, project):
+        with self.state_lock:
+            return [j["filename"] for j in self.in_flight if j["project"] is project]
+
+    def reserve_job(self, project, filename, description, code_prompt, depends_on=None):
+        """Register a planned file, renaming it (v2_, v3_, ...) if the name is
+        already committed or claimed by another in-flight job."""
+        with self.state_lock:
+            taken = set(project.get("files", []))
+            taken.update(j["filename"] for j in self.in_flight if j["project"] is project)
+            candidate = filename
+            version = 2
+            while candidate in taken:
+                candidate = f"v{version}_{filename}"
+                version += 1
+            job = {
+                "project": project,
+                "filename": candidate,
+                "description": description,
+                "code_prompt": code_prompt,
+                "depends_on": depends_on or [],
+            }
+            self.in_flight.append(job)
+            self.metrics.gauge("in_flight", len(self.in_flight))
+        job["id"] = uuid.uuid4().hex[:12]
+        self.journal.record(job["id"], "planned", project=project["folder_name"], filename=job["filename"],
+                            description=description, code_prompt=code_prompt, depends_on=job["depends_on"])
+        return job
+
+    def pick_project(self):
+        """(project, pending) for the next file, or (None, []) when a new
+        project should be started. Up to `concurrent_projects` projects are
+        open at once; the one with the fewest planned files goes first."""
+        candidates = []
+        for project in self.projects.active():
+            pending = self.pending_files(project)
+            if not self.needs_new_project(project, pending):
+                candidates.append((project.get("file_count", 0) + len(pending), project, pending))
+        if len(candidates) < max(1, int(self.config.get("concurrent_projects", 1))):
+            return None, []
+        _, project, pending = min(candidates, key=lambda c: c[0])
+        return project, pending
+
+    def prepare_project_dir(self, project):
+        # Setup Dir ONLY (Git is handled at root now)
+        project_dir = self.path("output", "projects", project["folder_name"])
+        os.makedirs(project_dir, exist_ok=True)
+
+        # CRITICAL FIX: Remove nested .git if it exists (force Monorepo)
+        nested_git = os.path.join(project_dir, ".git")
+        if os.path.exists(nested_git):
+            self.logger.log("Warning", f"Removing nested git repo in {project['folder_name']}")
+            # Windows specific force remove
+            try:
+                import shutil
+                # Handle read-only files in .git
+                def onerror(func, path, exc_info):
+                    import stat
+                    if not os.access(path, os.W_OK):
+                        os.chmod(path, stat.S_IWUSR)
+                        func(path)
+                    else:
+                        raise
+                shutil.rmtree(nested_git, onerror=onerror)
+            except Exception as e:
+                self.logger.log("Error", f"Failed to remove nested git: {e}")
+
+    # --- Helpers shared by the threaded and asyncio engines ---
+
+    def rank_models(self, all_models):
+        return rank_models(all_models)
+
+    def open_cache(self):
+        self.cache = self.shared.cache if self.shared else open_cache(self.config)
+        return self.cache
+
+    def forget_cached(self, key):
+        if key and self.cache:
+            self.cache.discard(key)
+
+    def quota_manager(self):
+        quota_file = self.config.get("gemini_quota_file", "gemini_quota.json")
+        return QuotaManager(self.config.get("gemini_quotas"), self.path(quota_file) if quota_file else None,
+                            self.logger, self.metrics)
+
+    def models_cache(self):
+        models_file = self.config.get("gemini_models_file", "gemini_models.json")
+        return ModelListCache(self.path(models_file) if models_file else None,
+                              float(self.config.get("gemini_models_ttl", 86400)))
+
+    def needs_new_project(self, project, pending):
+        return not project or project.get("file_count", 0) + len(pending) >= FILES_PER_PROJECT
+
+    def task_prompt(self, project, pending):
+        context = (
+            f"Project: {project['project_name']}\n"
+            f"Description: {project['description']}\n"
+            f"Existing Files: {', '.join(project.get('files', []) + pending)}"
+        )
+        api = compact(self.projects.symbols(project), int(self.config.get("plan_context_tokens", 300)))
+        if api:
+            context += f"\nExisting APIs:\n{api}"
+        return (
+            f"{context}\n"
+            "Suggest the next necessary Python file for this project. "
+            "Return JSON: {filename, description, code_prompt}"
+        )
+
+    def plan_prompt(self, project, pending):
+        """Batch planning: ask for every remaining file of the project at once."""
+        count = FILES_PER_PROJECT - project.get("file_count", 0) - len(pending)
+        context = (
+            f"Project: {project['project_name']}\n"
+            f"Description: {project['description']}\n"
+            f"Existing Files: {', '.join(project.get('files', []) + pending) or 'none'}"
+        )
+        api = compact(self.projects.symbols(project), int(self.config.get("plan_context_tokens", 300)))
+        if api:
+            context += f"\nExisting APIs:\n{api}"
+        return (
+            f"{context}\n"
+            f"Plan the remaining {count} Python files of this project, in the order they "
+            "should be written (a file only depends on files before it or existing ones). "
+            "Return JSON: {\"files\": [{filename, description, code_prompt, depends_on}]} "
+            "where depends_on lists the filenames it imports."
+        )
+
+    def parse_plan(self, response, project, pending):
+        """Planned files from a plan_prompt response, skipping names already
+        used; an empty list if the response can't be parsed."""
+        # Without JSON mode some models answer with the bare list
+        data = self.parse_json(response, "plan", PLAN_SCHEMA, PLAN_SCHEMA["properties"]["files"])
+        if isinstance(data, dict):
+            data = data["files"]
+        taken = set(project.get("files", []) + pending)
+        taken.update(e["filename"] for e in project.get("plan", []))
+        entries = []
+        for item in data or []:
+            if not item["filename"] or item["filename"] in taken:
+                continue
+            taken.add(item["filename"])
+            entries.append({
+                "filename": item["filename"],
+                "description": item["description"],
+                "code_prompt": item["code_prompt"],
+                "depends_on": item.get("depends_on", []),
+            })
+        return entries[:FILES_PER_PROJECT - project.get("file_count", 0) - len(pending)]
+
+    def parse_json(self, response, what, *schemas):
+        """First JSON value in `response` matching one of `schemas`, or None.
+        Prose around it is skipped and truncated JSON repaired (see bot_json)."""
+        for schema in schemas:
+            value, repaired = extract(response, schema)
+            if value is not None:
+                if repaired:
+                    self.logger.log("Warning", f"Repaired truncated {what} JSON")
+                    self.metrics.incr("json_repairs")
+                return value
+        self.logger.log("Error", f"No valid {what} JSON in response")
+        self.metrics.incr("parse_failures")
+        return None
+
+    def response_schema(self, schema):
+        """`schema` when Gemini should answer in JSON mode, else None."""
+        return schema if self.config.get("structured_output", True) else None
+
+    def next_planned(self, project, pending):
+        """Next file of the project's batch plan that is neither committed nor
+        in flight (preferring one whose dependencies are committed), or None
+        when the plan is used up."""
+        done = set(project.get("files", []))
+        remaining = [e for e in project.get("plan", [])
+                     if e["filename"] not in done and e["filename"] not in pending]
+        if not remaining:
+            return None
+        ready = [e for e in remaining if done.issuperset(e.get("depends_on", []))]
+        return (ready or remaining)[0]
+
+    def code_prompt(self, job):
+        # Project-level text first: it is identical for every file of the
+        # project, so Ollama can reuse that prefix from its KV cache.
+        prompt = f"Context: {job['project']['description']}\n"
+        # Sibling modules as signatures only, so shared helpers get imported, not rewritten
+        symbols = self.projects.symbols(job["project"])
+        symbols.pop(job["filename"], None)
+        api = compact(symbols, int(self.config.get("code_context_tokens", 600)))
+        # Planned dependencies that aren't committed yet have no symbols; describe them instead
+        planned = {e["filename"]: e["description"] for e in job["project"].get("plan", [])}
+        upcoming = [f"{dep}: {planned[dep]}" for dep in job.get("depends_on", [])
+                    if dep not in symbols and dep in planned]
+        if upcoming:
+            api = "\n".join(filter(None, [api] + upcoming))
+        if api:
+            prompt += f"Other modules in this project (import from them):\n{api}\n"
+        prompt += (
+            f"Write complete Python code for '{job['filename']}'.\n"
+            f"Requirement: {job['code_prompt']}\n"
+        )
+        if job.get("feedback"):
+            prompt += f"A previous version failed these checks, avoid them:\n{job['feedback']}\n"
+        return prompt + "Return ONLY code."
+
+    def check_validation(self, job, result):
+        """Act on a Validator result: "ok", "retry" (regenerate with the
+        errors as feedback) or "drop". Failed output is removed from disk."""
+        self.validator.record(result)
+        for warning in result["warnings"][:3]:
+            self.logger.log("Warning", f"{job['filename']}: {warning}")
+        if not result["errors"]:
+            return "ok"
+        self.logger.log("Error", f"{job['filename']} failed validation: {result['errors'][0]}")
+        # A cache hit would hand the regeneration the same broken code
+        self.forget_cached(job.pop("cache_key", None))
+        try:
+            os.remove(job["path"])
+        except OSError:
+            pass
+        if job.get("attempts", 0) < int(self.config.get("validate_retries", 1)):
+            job["attempts"] = job.get("attempts", 0) + 1
+            job["feedback"] = "\n".join(result["errors"][:10])
+            self.metrics.incr("regenerations")
+            return "retry"
+        # Its planned dependents would import a broken module: plan them again
+        dropped = self.projects.drop_from_plan(job["project"], job["filename"])
+        if dropped:
+            self.logger.log("System", f"Re-planning {', '.join(dropped)}")
+            self.metrics.incr("replans")
+        # ...and so would a cached plan for the files that replace it
+        self.replanning.add(job["project"]["folder_name"])
+        self.journal.record(job["id"], "dropped")
+        return "drop"
+
+    def job_path(self, job):
+        # Relative to the repo root when root is "." (GitManager resolves either way)
+        return self.path("output", "projects", job["project"]["folder_name"], job["filename"])
+
+    def parse_task(self, response):
+        """Extract the {filename, description, code_prompt} dict, or None."""
+        return self.parse_json(response, "task", TASK_SCHEMA)
+
+    def record_commit(self, job):
+        """Bookkeeping after a file has been committed."""
+        project = job["project"]
+        new_count = self.stats.increment(job.get("model"), project["folder_name"], job["filename"])
+        self.metrics.incr("files_committed")
+        self.metrics.gauge("daily_count", new_count)
+        max_commits = int(self.config.get("max_commits", 20))
+        self.logger.log("System", f"Daily Progress: {new_count}/{max_commits}")
+
+        self.projects.add_file(project, job["filename"], FILES_PER_PROJECT, self.file_symbols(job))
+
+    def file_symbols(self, job):
+        if not job["filename"].endswith(".py"):
+            return None
+        try:
+            with open(job["path"], "r", encoding="utf-8", errors="replace") as f:
+                return summarize(f.read())
+        except OSError:
+            return None
+
+    def project_from_idea(self, idea_resp):
+        idea = self.parse_json(idea_resp, "project idea", IDEA_SCHEMA)
+        if not idea:
+            return None
+        today_str = datetime.datetime.now().strftime("%Y%m%d")
+        safe_name = "".join([c for c in idea["folder_name"] if c.isalnum() or c in ('_','-')]) or "Project"
+        folder_name = f"{today_str}_{safe_name}"
+
+        project = {
+            "project_name": idea["project_name"] or "Unnamed",
+            "folder_name": folder_name,
+            "description": idea["description"] or "A cool project",
+            "file_count": 0,
+            "files": []
+        }
+        self.projects.add(project)
+        self.logger.log("System", f"New Project: {project['project_name']}")
+        self.metrics.incr("projects")
+        return project
 
     def run_loop(self):
         try:
-            self.gemini = GeminiClient(self.config["gemini_key"], self.logger)
-            self.ollama = OllamaClient(self.config["model"], self.logger)
-            
-            output_dir = "output"
-            os.makedirs(output_dir, exist_ok=True)
-            
-            # Model Selection
-            self.logger.log("System", "Connecting to Gemini...")
-            all_models = self.gemini.list_models()
-            
-            PRIORITY_ORDER = [
-                "models/gemini-1.5-flash",
-                "models/gemini-1.5-flash-latest",
-                "models/gemini-1.5-pro",
-                "models/gemini-1.5-pro-latest",
-                "models/gemini-1.0-pro"
-            ]
-            
-            candidates = [m for m in PRIORITY_ORDER if m in all_models]
-            other_flash = [m for m in all_models if 'flash' in m.lower() and m not in candidates]
-            other_flash.sort(reverse=True)
-            candidates.extend(other_flash)
-            candidates.extend([m for m in all_models if m not in candidates])
-            if not candidates: candidates = ["models/gemini-1.5-flash"]
-            
-            current_model_index = 0
-            
-            # Main Project Loop
-            project_path = os.path.join(output_dir, "Daily_Project")
-            
-            # --- Monorepo Git Init (Root) ---
-            # We treat the current directory as the main repo
-            self.git = GitManager(".", self.logger, self.config)
-            self.git.init_repo() # Init root if needed
-            
-            consecutive_errors = 0
-            
-            # --- SUPER LOOP: Indestructible ---
-            while not self.stop_event.is_set():
-                try: 
-                    # --- 1. Daily Limit Check ---
-                    current_count = self.stats.get_count()
-                    max_commits = int(self.config.get("max_commits", 20))
-                    
-                    if current_count >= max_commits:
-                        self.logger.log("System", f"Daily Limit Reached ({current_count}/{max_commits})")
-                        time.sleep(60)
-                        continue
+            if not self.journal.open():
+                owner = self.journal.owner()
+                self.logger.log("Error", f"{self.journal.path} is in use by another bot process"
+                                         f"{f' (pid {owner})' if owner else ''}; not starting")
+                return
+            if self.shared:
+                self.idle = self.shared.idle
+                self.validator = self.shared.validator
+            else:
+                metrics_file = self.config.get("metrics_file", "metrics.json")
+                self.exporter = MetricsExporter(self.metrics, self.path(metrics_file) if metrics_file else None,
+                                                float(self.config.get("metrics_interval", 30)),
+                                                int(self.config.get("metrics_port", 0)))
+                self.exporter.start()
 
-                    current_model = candidates[current_model_index]
-                    
-                    # --- 2. Project State Management ---
-                    project_state_file = "current_project.json"
-                    current_project = {}
-                    if os.path.exists(project_state_file):
-                        try:
-                            with open(project_state_file, "r") as f:
-                                current_project = json.load(f)
-                        except: pass
-                    
-                    # Start New Project? (If none or > 5 files)
-                    if not current_project or current_project.get("file_count", 0) >= 5:
-                        self.logger.log("Gemini", f"Brainstorming NEW project ({current_model})...")
-                        idea_prompt = (
-                            "Generate a unique, intermediate-level Python project idea. "
-                            "It should be a valid, real-world tool or utility. "
-                            "Return JSON: {project_name, folder_name, description}"
-                        )
-                        idea_resp = self.gemini.generate_content(idea_prompt, current_model)
-                        
-                        if idea_resp:
-                            self.log_transcript("Gemini (Ideation)", idea_prompt, idea_resp)
-                            try:
-                                json_str = re.search(r'\{.*\}', idea_resp, re.DOTALL)
-                                if json_str:
-                                    idea = json.loads(json_str.group(0))
-                                    today_str = datetime.datetime.now().strftime("%Y%m%d")
-                                    safe_name = "".join([c for c in idea.get('folder_name', 'Project') if c.isalnum() or c in ('_','-')])
-                                    folder_name = f"{today_str}_{safe_name}"
-                                    
-                                    current_project = {
-                                        "project_name": idea.get("project_name", "Unnamed"),
-                                        "folder_name": folder_name,
-                                        "description": idea.get("description", "A cool project"),
-                                        "file_count": 0,
-                                        "files": []
-                                    }
-                                    with open(project_state_file, "w") as f:
-                                        json.dump(current_project, f)
-                                    self.logger.log("System", f"New Project: {current_project['project_name']}")
-                            except: pass
-
-                    if not current_project:
-                        time.sleep(5)
-                        continue
+                self.idle = IdleDetector.from_config(self.config, self.logger, self.metrics)
+                self.idle.start()
 
-                    # Setup Dir ONLY (Git is handled at root now)
-                    project_dir = os.path.join(output_dir, "projects", current_project["folder_name"])
-                    os.makedirs(project_dir, exist_ok=True)
-
-                    # CRITICAL FIX: Remove nested .git if it exists (force Monorepo)
-                    nested_git = os.path.join(project_dir, ".git")
-                    if os.path.exists(nested_git):
-                        self.logger.log("Warning", f"Removing nested git repo in {current_project['folder_name']}")
-                        # Windows specific force remove
-                        try:
-                            import shutil
-                            # Handle read-only files in .git
-                            def onerror(func, path, exc_info):
-                                import stat
-                                if not os.access(path, os.W_OK):
-                                    os.chmod(path, stat.S_IWUSR)
-                                    func(path)
-                                else:
-                                    raise
-                            shutil.rmtree(nested_git, onerror=onerror)
-                        except Exception as e:
-                            self.logger.log("Error", f"Failed to remove nested git: {e}")
-                    
-                    # Generate File
-                    context = (
-                        f"Project: {current_project['project_name']}\n"
-                        f"Description: {current_project['description']}\n"
-                        f"Existing Files: {', '.join(current_project.get('files', []))}"
-                    )
-                    task_prompt = (
-                        f"{context}\n"
-                        "Suggest the next necessary Python file for this project. "
-                        "Return JSON: {filename, description, code_prompt}"
-                    )
-                    
-                    self.logger.log("Gemini", f"Designing next file for {current_project['project_name']}...")
-                    response = self.gemini.generate_content(task_prompt, current_model)
-                    
-                    if not response:
-                        # Rotation Logic
-                        self.logger.log("Warning", f"Model {current_model} failed. Rotating...")
-                        if len(candidates) > 1:
-                            current_model_index = (current_model_index + 1) % len(candidates)
-                            time.sleep(1)
-                            continue
-                        else:
-                            time.sleep(5)
-                            continue
-                    
-                    self.log_transcript("Gemini (Task)", task_prompt, response)
+                if self.config.get("validate", True):
+                    self.validator = Validator(int(self.config.get("validate_workers", 2)),
+                                               bool(self.config.get("validate_strict_imports", False)),
+                                               self.metrics)
 
-                    try:
-                        json_str = re.search(r'\{.*\}', response, re.DOTALL)
-                        if json_str:
-                            task = json.loads(json_str.group(0))
-                            filename = task.get("filename", "utils.py")
-                            desc = task.get("description", "Utility")
-                            code_prompt = task.get("code_prompt", "Write code")
-                            
-                            if filename in current_project.get("files", []):
-                                filename = f"v2_{filename}"
-                            
-                            self.logger.log("System", f"Task: Create {filename}")
-                            
-                            # --- IDLE CHECK BEFORE HEAVY OLLAMA WORK ---
-                            while not self.is_system_idle() and not self.stop_event.is_set():
-                                time.sleep(30) # Wait 30s and check again
-                            
-                            if self.stop_event.is_set(): break
-
-                            self.logger.log("Ollama", "Coding...")
-                            
-                            full_code = (
-                                f"Write complete Python code for '{filename}'.\n"
-                                f"Context: {current_project['description']}\n"
-                                f"Requirement: {code_prompt}\n"
-                                "Return ONLY code."
-                            )
-                            code = self.ollama.generate(full_code)
-                            
-                            if code:
-                                self.log_transcript("Ollama (Coding)", full_code, code)
-                                code = re.sub(r"^`{3,}[a-zA-Z]*\n", "", code.strip())
-                                code = re.sub(r"\n`{3,}$", "", code.strip())
-                                
-                                # Calculate relative path for git add (since git is at root)
-                                rel_path = os.path.join("output", "projects", current_project["folder_name"], filename)
-                                
-                                with open(rel_path, "w") as f:
-                                    f.write(code)
-                                    
-                                if self.git.commit(rel_path, f"feat: {desc}"):
-                                    self.git.push() # Push changes to remote
-                                    new_count = self.stats.increment()
-                                    self.logger.log("System", f"Daily Progress: {new_count}/{max_commits}")
-                                    
-                                    current_project["file_count"] += 1
-                                    current_project["files"].append(filename)
-                                    with open(project_state_file, "w") as f:
-                                        json.dump(current_project, f)
-                                
-                                for _ in range(self.config["interval"]):
-                                    if self.stop_event.is_set(): break
-                                    time.sleep(1)
-                            else:
-                                self.logger.log("Error", "Ollama produced no code")
-                    except Exception as e:
-                        self.logger.log("Error", f"Failed to parse task: {e}")
-                    
-                    if self.stop_event.is_set(): break
-                    time.sleep(5)
-                    
-                except Exception as e:
-                    self.logger.log("CRITICAL", f"Safety Loop Error: {e}")
-                    import traceback
-                    traceback.print_exc()
-                    time.sleep(10) # Wait before retry
-                
+            self.transcripts = TranscriptStore(self.path(self.config.get("transcript_dir", "transcripts")),
+                                               int(float(self.config.get("transcript_segment_mb", 10)) * 1024 * 1024),
+                                               self.config.get("transcript_compress", "gzip"))
+            self.transcripts.start()
+
+            # The asyncio engine has its own clients, so it can't use shared ones
+            if self.config.get("engine", "threads") == "asyncio" and not self.shared:
+                from bot_async import AsyncEngine
+                self.engine = AsyncEngine(self)
+                self.engine.run()
+            else:
+                self.run_threads()
         finally:
-            self.logger.log("System", "Bot Stopped")
+            if self.exporter:
+                self.exporter.stop()
+                self.exporter = None
+            if self.idle and not self.shared:
+                self.idle.stop()
+            if self.transcripts:
+                self.transcripts.close()
+                self.transcripts = None
+            if self.validator and not self.shared:
+                self.validator.close()
+            self.validator = None
+            self.engine = None
+            self.journal.close()
+            self.logger.log("System", "Bot Stopped", event="stopped")
+            if self.log_sink:
+                self.log_sink.stop()
             self.running = False
+
+    def run_threads(self):
+        """Threaded engine: planner, one coder per Ollama slot, committer."""
+        if self.shared:
+            # Supervisor mode: clients, scheduler and warmup belong to SharedResources
+            self.gemini = self.shared.gemini
+            self.scheduler = self.shared.scheduler
+        else:
+            cache = self.open_cache()
+
+            # Clients (and their cached model list) survive restarts
+            gemini_url = self.config.get("gemini_url", GeminiClient.BASE_URL)
+            if not self.gemini or (self.gemini.api_key, self.gemini.base_url) != (self.config["gemini_key"], gemini_url):
+                self.gemini = GeminiClient(self.config["gemini_key"], self.logger, self.pool, base_url=gemini_url,
+                                           router=self.router, models_cache=self.models_cache())
+            self.gemini.cache = cache
+
+            def make_ollama(url, model):
+                client = OllamaClient(model, self.logger, self.config, self.pool, cache)
+                client.url = url
+                return client
+            self.scheduler = OllamaScheduler(self.config, self.logger, make_ollama, self.metrics)
+            self.scheduler.idle = self.idle
+            if self.config.get("ollama_warmup", True):
+                for endpoint in self.scheduler.endpoints:
+                    threading.Thread(target=self.warmup, args=(endpoint.clients[0],), daemon=True).start()
+        
+        output_dir = self.path("output")
+        os.makedirs(output_dir, exist_ok=True)
+        
+        # Model discovery runs beside the pipeline; the planner waits for it
+        if not self.shared:
+            threading.Thread(target=self.discover_models, daemon=True).start()
+
+        # --- Monorepo Git Init (Root) ---
+        # The gardener's root directory is the main repo
+        self.git = GitManager(self.root, self.logger, self.config, self.metrics)
+        self.git.init_repo() # Init root if needed
+
+        # --- Pipeline: planner -> coder -> committer ---
+        # Bounded queues let Gemini plan the next file while Ollama is
+        # still coding the current one, without planning far ahead.
+        depth = max(1, int(self.config.get("pipeline_depth", 1)))
+        workers = self.scheduler.capacity
+        self.plan_queue = queue.Queue(maxsize=max(depth, workers))
+        self.code_queue = queue.Queue(maxsize=depth)
+        self.validate_queue = queue.Queue(maxsize=depth)
+        # Regenerations bypass the bounded plan queue so validators never block on coders
+        self.retry_queue = queue.Queue()
+        self.in_flight = []
+        # Unfinished jobs of a previous run go first (the queue is unbounded)
+        for job in self.resume_jobs(self.git):
+            self.retry_queue.put(job)
+
+        stages = [
+            threading.Thread(target=self.planner_stage, daemon=True),
+        ]
+        # One coder per Ollama slot; the scheduler spreads them over endpoints
+        stages += [threading.Thread(target=self.coder_stage, daemon=True) for _ in range(workers)]
+        if self.validator:
+            stages += [threading.Thread(target=self.validate_stage, daemon=True)
+                       for _ in range(self.validator.processes)]
+        for stage in stages:
+            stage.start()
+        self.mark_ready("pipeline")
+
+        self.commit_stage()
+
+        for stage in stages:
+            stage.join()
+
+    def discover_models(self):
+        self.logger.log("System", "Connecting to Gemini...")
+        self.router.set_models(self.rank_models(self.gemini.list_models()))
+        self.mark_ready("models")
+
+    def mark_ready(self, what):
+        """Record how long `what` ("pipeline" or "models") took since start()."""
+        if self.started_at is None:
+            return
+        seconds = time.perf_counter() - self.started_at
+        self.metrics.gauge(f"startup_{what}_seconds", round(seconds, 3))
+        self.logger.log("System", f"Startup: {what} ready after {seconds:.2f}s", event=f"{what}_ready")
+
+    def planner_stage(self):
+        """Stage 1: Gemini picks the project and designs the next file."""
+        while not self.stop_event.is_set():
+            if not self.router.ready.wait(0.5):
+                continue
+            try:
+                action = self.next_plan_step()
+                if action[0] == "ask":
+                    request = action[1]
+                    with self.metrics.span(request["span"]):
+                        response = self.gemini.generate_content(request["prompt"], request["model"],
+                                                               cache=request["cache"], kind=request["kind"],
+                                                               schema=request["schema"])
+                    action = self.plan_response(request, response)
+                if not action:
+                    continue
+                if action[0] == "job":
+                    self.queue_task(*action[1])
+                else:
+                    self.wait(action[1])
+
+            except Exception as e:
+                self.logger.log("CRITICAL", f"Safety Loop Error: {e}")
+                import traceback
+                traceback.print_exc()
+                self.wait(10) # Wait before retry
+
+    def next_plan_step(self):
+        """The planner's next move, decided without any network I/O.
+
+        Returns ("job", (project, task)) for a file ready to queue, ("ask",
+        request) when Gemini has to be called (its answer goes to
+        plan_response), ("wait", seconds) to back off, or ("full", seconds)
+        when in-flight jobs reserve the rest of the daily budget, so an
+        engine that can tell may instead wait for one to finish. Both
+        engines' planners run on this and only differ in how they call
+        Gemini and wait.
+        """
+        # --- 1. Daily Limit Check (committed + already in the pipeline) ---
+        current_count = self.stats.get_count()
+        max_commits = int(self.config.get("max_commits", 20))
+
+        self.metrics.gauge("daily_count", current_count)
+        if current_count >= max_commits:
+            if not self.limit_reached:
+                self.logger.log("System", f"Daily Limit Reached ({current_count}/{max_commits})", event="daily_limit")
+                self.limit_reached = True
+            # Re-check every minute in case the limit is raised, or at midnight
+            now = datetime.datetime.now()
+            midnight = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time())
+            return "wait", min(60, (midnight - now).total_seconds() + 1)
+        self.limit_reached = False
+
+        with self.state_lock:
+            reserved = len(self.in_flight)
+        if current_count + reserved >= max_commits:
+            return "full", 5
+
+        # --- 2. Project State Management ---
+        # Start New Project? (If every open project has 5 files planned)
+        project, pending = self.pick_project()
+        if not project:
+            model = self.router.pick("ideation")
+            if not model:
+                return "wait", self.router.wait_time()
+            self.logger.log("Gemini", f"Brainstorming NEW project ({model})...")
+            # Never cached: the prompt is constant, so a hit would repeat the same project
+            return "ask", {"step": "ideation", "span": "ideation", "model": model, "kind": "ideation",
+                           "prompt": IDEA_PROMPT, "cache": False, "schema": self.response_schema(IDEA_SCHEMA)}
+
+        # Batch planning: the next file comes from the stored plan,
+        # Gemini is only asked when the plan is used up
+        batch = self.config.get("batch_planning", True)
+        task = self.next_planned(project, pending) if batch else None
+        if task:
+            return "job", (project, task)
+
+        # The router skips models that are resting after errors or 429s
+        model = self.router.pick("task")
+        if not model:
+            return "wait", self.router.wait_time()
+
+        request = {"span": "planning", "model": model, "kind": "task", "project": project, "pending": pending,
+                   "cache": project["folder_name"] not in self.replanning}
+        if batch:
+            self.logger.log("Gemini", f"Planning files for {project['project_name']}...")
+            request.update(step="plan", prompt=self.plan_prompt(project, pending),
+                           schema=self.response_schema(PLAN_SCHEMA))
+        else:
+            self.logger.log("Gemini", f"Designing next file for {project['project_name']}...")
+            request.update(step="task", prompt=self.task_prompt(project, pending),
+                           schema=self.response_schema(TASK_SCHEMA))
+        return "ask", request
+
+    def plan_response(self, request, response):
+        """Apply Gemini's answer to a request from next_plan_step.
+
+        Returns ("job", (project, task)), ("wait", seconds), or None to
+        plan again right away.
+        """
+        step = request["step"]
+        if not response:
+            self.metrics.incr("gemini_failures")
+            if step == "ideation":
+                return "wait", 5
+            self.metrics.incr("model_rotations")
+            return None
+
+        if step == "ideation":
+            self.log_transcript("Gemini (Ideation)", request["prompt"], response)
+            return None if self.project_from_idea(response) else ("wait", 5)
+
+        project, pending = request["project"], request["pending"]
+        self.replanning.discard(project["folder_name"])
+        if step == "plan":
+            self.log_transcript("Gemini (Plan)", request["prompt"], response)
+            entries = self.parse_plan(response, project, pending)
+            if not entries:
+                return "wait", 5
+            self.projects.extend_plan(project, entries)
+            self.logger.log("System", f"Plan: {', '.join(e['filename'] for e in entries)}")
+            return None
+
+        self.log_transcript("Gemini (Task)", request["prompt"], response)
+        task = self.parse_task(response)
+        return ("job", (project, task)) if task else ("wait", 5)
+
+    def queue_task(self, project, task):
+        job = self.reserve_job(project, task.get("filename", "utils.py"),
+                               task.get("description", "Utility"),
+                               task.get("code_prompt", "Write code"),
+                               task.get("depends_on"))
+        self.logger.log("System", f"Task: Create {job['filename']}")
+        if not self.put_stage(self.plan_queue, job):
+            self.release_job(job)
+
+    def generate_code(self, client, full_code, rel_path, session=None):
+        """Run one Ollama generation into `rel_path`; returns the code or None."""
+        if self.config.get("ollama_stream", True):
+            with self.metrics.span("generation"):
+                code = client.generate_to_file(full_code, rel_path, self.stop_event, session)
+            if code and client.last_stats.get("cached"):
+                self.logger.log("Ollama", "Reused cached code")
+                self.metrics.incr("cache_hits")
+            elif code:
+                stats = client.last_stats
+                self.logger.log("Ollama", f"Streamed {stats['tokens']} tokens in {stats['duration']:.1f}s "
+                                          f"(first token {stats['first_token'] or 0:.1f}s)")
+                if stats["first_token"] is not None:
+                    self.metrics.observe("first_token", stats["first_token"])
+                self.metrics.incr("tokens", stats["tokens"])
+            return code
+
+        with self.metrics.span("generation"):
+            code = client.generate(full_code, session)
+        if code:
+            code = re.sub(r"^`{3,}[a-zA-Z]*\n", "", code.strip())
+            code = re.sub(r"\n`{3,}$", "", code.strip())
+            with self.metrics.span("file_write"):
+                with open(rel_path, "w") as f:
+                    f.write(code)
+        return code
+
+    def coder_stage(self):
+        """Stage 2: Ollama writes the code for each planned file (one thread per slot)."""
+        while not self.stop_event.is_set():
+            try:
+                job = self.retry_queue.get_nowait()
+            except queue.Empty:
+                job = self.get_stage(self.plan_queue)
+            if job is None:
+                continue
+
+            if job.pop("resumed", False):
+                # Its file survived a crash: straight on to validation/commit
+                self.logger.log("System", f"Resuming {job['filename']} from its written file")
+                job["validated"] = False
+                if not self.put_stage(self.validate_queue if self.validator else self.code_queue, job):
+                    self.release_job(job)
+                continue
+
+            try:
+                # --- IDLE CHECK BEFORE HEAVY OLLAMA WORK ---
+                # Starts the moment the detector sees the machine go idle
+                if not self.wait_for_idle():
+                    self.release_job(job)
+                    break
+
+                self.logger.log("Ollama", f"Coding {job['filename']}...")
+                self.prepare_project_dir(job["project"])
+                rel_path = self.job_path(job)
+                full_code = self.code_prompt(job)
+                slot = self.scheduler.acquire(self.stop_event)
+                if slot is None:
+                    self.release_job(job)
+                    break
+                job["validated"] = False
+                extras = self.speculative_slots(slot)
+                if extras:
+                    code = self.speculate(job, full_code, rel_path, [slot] + extras)
+                else:
+                    endpoint, client = slot
+                    job["model"] = endpoint.model
+                    code = None
+                    try:
+                        code = self.generate_code(client, full_code, rel_path, job["project"]["folder_name"])
+                        job["cache_key"] = client.last_key
+                    finally:
+                        self.scheduler.release(endpoint, client,
+                                               None if self.stop_event.is_set() else bool(code))
+
+                if not code:
+                    if self.stop_event.is_set():
+                        self.release_job(job)  # resumed on the next start
+                    else:
+                        self.logger.log("Error", "Ollama produced no code")
+                        self.metrics.incr("ollama_failures")
+                        self.metrics.incr("retries")
+                        self.drop_job(job)
+                    continue
+
+                self.log_transcript("Ollama (Coding)", full_code, code)
+                job["path"] = rel_path
+                self.journal.record(job["id"], "written", sha256=file_hash(rel_path))
+
+                checked = job["validated"] or not self.validator
+                if not self.put_stage(self.code_queue if checked else self.validate_queue, job):
+                    self.release_job(job)
+
+            except Exception as e:
+                self.logger.log("CRITICAL", f"Safety Loop Error: {e}")
+                self.release_job(job)
+                self.wait(10)
+
+    def speculative_slots(self, slot):
+        """Extra Ollama slots for racing `slot`'s generation, if speculation
+        is on, the machine has CPU headroom and slots are free right now."""
+        k = int(self.config.get("speculative_k", 1))
+        if k <= 1 or not self.config.get("ollama_stream", True):
+            return []
+        if self.scheduler.headroom() < float(self.config.get("speculative_min_headroom", 50)):
+            return []
+        extras = []
+        models = {slot[0].model}
+        for _ in range(k - 1):
+            extra = self.scheduler.try_acquire(models)
+            if extra is None:
+                break
+            extras.append(extra)
+            models.add(extra[0].model)
+        return extras
+
+    def speculate(self, job, prompt, rel_path, slots):
+        """Race one generation per slot (varying model, temperature and seed)
+        and keep the first that passes validation, cancelling the others.
+
+        The winner is moved to `rel_path` and marks the job validated. If
+        none passes, the first finished output goes through the normal
+        validate stage so its errors drive a regeneration. Returns the code
+        or None.
+        """
+        temperatures = self.config.get("speculative_temperatures") or [0.7]
+        race = threading.Event()
+        lock = threading.Lock()
+        running = set()
+        outcomes = []  # (index, code, endpoint, passed) in finishing order
+        keys = {}  # index -> cache entry of its generation
+        session = job["project"]["folder_name"]
+        self.metrics.incr("speculations")
+        self.logger.log("Ollama", f"Racing {len(slots)} generations of {job['filename']}")
+
+        def variant(index):
+            # Keep the extension so the validator checks the variant like the real file
+            root, ext = os.path.splitext(rel_path)
+            return f"{root}.spec{index}{ext}"
+
+        def attempt(index, endpoint, client):
+            path = variant(index)
+            options = {"temperature": temperatures[index % len(temperatures)], "seed": index + 1}
+            code = None
+            passed = False
+            try:
+                with self.metrics.span("generation"):
+                    code = client.generate_to_file(prompt, path, race, session, options)
+                keys[index] = client.last_key
+                if code:
+                    self.metrics.incr("tokens", client.last_stats.get("tokens", 0))
+                with lock:
+                    running.discard(index)
+                if code and race.is_set():
+                    pass  # lost the race, no need to check it
+                elif code and self.validator:
+                    result = self.validator.validate(path)
+                    self.validator.record(result)
+                    passed = not result["errors"]
+                    if not passed:
+                        self.forget_cached(keys[index])
+                elif code:
+                    passed = True
+                with lock:
+                    outcomes.append((index, code, endpoint, passed))
+                    if passed and not race.is_set():
+                        race.set()
+                        # Only clients still generating; finished ones may serve other jobs already
+                        for other, (_, other_client) in enumerate(slots):
+                            if other in running:
+                                other_client.cancel()
+            finally:
+                with lock:
+                    running.discard(index)
+                self.scheduler.release(endpoint, client, None if race.is_set() and not code else bool(code))
+
+        threads = []
+        for index, (endpoint, client) in enumerate(slots):
+            running.add(index)
+            threads.append(threading.Thread(target=attempt, args=(index, endpoint, client), daemon=True))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(0.5)
+                if self.stop_event.is_set():
+                    race.set()
+
+        winner = next((o for o in outcomes if o[3]), None) or next((o for o in outcomes if o[1]), None)
+        for index, code, endpoint, passed in outcomes:
+            path = variant(index)
+            if winner and index == winner[0] and not self.stop_event.is_set():
+                os.replace(path, rel_path)
+            elif os.path.exists(path):
+                os.remove(path)
+        if not winner or self.stop_event.is_set():
+            return None
+        index, code, endpoint, passed = winner
+        job["model"] = endpoint.model
+        job["cache_key"] = keys.get(index)
+        job["validated"] = passed and self.validator is not None
+        self.metrics.incr("speculative_cancelled", sum(1 for o in outcomes if not o[1]))
+        self.logger.log("Ollama", f"Kept variant {index + 1}/{len(slots)} of {job['filename']} "
+                                  f"({endpoint.model}, {'valid' if passed else 'unvalidated'})")
+        return code
+
+    def validate_stage(self):
+        """Stage 2b: syntax/lint checks in the process pool before committing."""
+        while not self.stop_event.is_set():
+            job = self.get_stage(self.validate_queue)
+            if job is None:
+                continue
+            try:
+                with self.metrics.span("validation"):
+                    result = self.validator.validate(job["path"])
+                verdict = self.check_validation(job, result)
+                if verdict == "ok":
+                    if not self.put_stage(self.code_queue, job):
+                        self.release_job(job)
+                elif verdict == "retry":
+                    self.logger.log("System", f"Regenerating {job['filename']}")
+                    self.retry_queue.put(job)
+                else:
+                    self.release_job(job)
+            except Exception as e:
+                self.logger.log("CRITICAL", f"Safety Loop Error: {e}")
+                self.release_job(job)
+
+    def commit_stage(self):
+        """Stage 3: commit and push finished files, then pace by `interval`."""
+        while not self.stop_event.is_set():
+            job = self.get_stage(self.code_queue)
+            if job is None:
+                if self.git.schedule_push():
+                    self.journal.pushed()
+                continue
+
+            try:
+                if self.git.commit(job["path"], f"feat: {job['description']}"):
+                    self.record_commit(job)
+                    self.journal.record(job["id"], "committed")
+                    if self.git.schedule_push(): # Push changes to remote (coalesced)
+                        self.journal.pushed()
+                else:
+                    self.metrics.incr("commit_failures")
+                    self.journal.record(job["id"], "dropped")
+            except Exception as e:
+                self.logger.log("CRITICAL", f"Safety Loop Error: {e}")
+                import traceback
+                traceback.print_exc()
+            finally:
+                self.release_job(job)
+
+            self.wait(int(self.config["interval"]))
+
+        # Don't leave commits sitting locally when the bot stops
+        if self.git.unpushed and self.git.push():
+            self.journal.pushed()
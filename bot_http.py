@@ -0,0 +1,163 @@
+"""
+bot_http.py - Keep-alive HTTP connection pool shared by the LLM clients
+"""
+import time
+import functools
+import threading
+import urllib.parse
+
+# Errors that mean a reused keep-alive socket was closed by the server
+# while it sat idle (http.client.RemoteDisconnected is a ConnectionResetError).
+# They are also what a server that crashed or dropped the connection
+# mid-request produces, so ConnectionPool.open only retries when the request
+# can't have been processed: sending it failed, or no status line came back
+# on a connection that had been idle for at least STALE_AFTER seconds.
+STALE_ERRORS = (ConnectionResetError, BrokenPipeError, ConnectionAbortedError)
+STALE_AFTER = 1.0
+
+_response_class = None
+
+def response_class():
+    """HTTPResponse that notes on its connection when the status line arrived."""
+    global _response_class
+    if _response_class is None:
+        import http.client
+
+        class PooledResponse(http.client.HTTPResponse):
+            def __init__(self, sock, *args, conn=None, **kwargs):
+                super().__init__(sock, *args, **kwargs)
+                self.pooled_conn = conn
+
+            def _read_status(self):
+                status = super()._read_status()
+                self.pooled_conn.status_read = True
+                return status
+        _response_class = PooledResponse
+    return _response_class
+
+class HTTPError(Exception):
+    def __init__(self, status, reason, body=b"", headers=None):
+        super().__init__(f"HTTP {status} {reason}")
+        self.status = status
+        self.reason = reason
+        self.body = body
+        self.headers = headers or {}
+
+class ConnectionPool:
+    """Per-host pool of persistent http.client connections.
+
+    At most `max_idle` idle connections are kept per (scheme, host, port);
+    connections idle for longer than `idle_timeout` seconds are closed
+    instead of being reused.
+    """
+
+    def __init__(self, max_idle=4, idle_timeout=60, stale_after=STALE_AFTER):
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.stale_after = stale_after
+        self.lock = threading.Lock()
+        self.idle = {}
+        self.stats = {"created": 0, "reused": 0, "retried": 0}
+
+    def _key(self, url):
+        parts = urllib.parse.urlsplit(url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        return (parts.scheme, parts.hostname, port)
+
+    def _path(self, url):
+        parts = urllib.parse.urlsplit(url)
+        path = parts.path or "/"
+        return f"{path}?{parts.query}" if parts.query else path
+
+    def acquire(self, url, timeout):
+        """Return (connection, reused) for the host of `url`."""
+        key = self._key(url)
+        now = time.time()
+        with self.lock:
+            stack = self.idle.get(key, [])
+            while stack:
+                conn, last_used = stack.pop()
+                if conn.sock is None or now - last_used > self.idle_timeout:
+                    conn.close()
+                    continue
+                self.stats["reused"] += 1
+                conn.idle_for = now - last_used
+                conn.timeout = timeout
+                conn.sock.settimeout(timeout)
+                return conn, True
+            self.stats["created"] += 1
+
+        # Imported on first use: http.client (with email and ssl) is the
+        # largest import of the bot and nothing needs it before the first request
+        import http.client
+        scheme, host, port = key
+        if scheme == "https":
+            conn = http.client.HTTPSConnection(host, port, timeout=timeout)
+        else:
+            conn = http.client.HTTPConnection(host, port, timeout=timeout)
+        conn.pool_key = key
+        conn.idle_for = 0
+        conn.response_class = functools.partial(response_class(), conn=conn)
+        return conn, False
+
+    def release(self, conn, reuse=True):
+        """Return a connection whose response has been fully read."""
+        if not reuse or conn.sock is None:
+            conn.close()
+            return
+        with self.lock:
+            stack = self.idle.setdefault(conn.pool_key, [])
+            if len(stack) >= self.max_idle:
+                conn.close()
+                return
+            stack.append((conn, time.time()))
+
+    def open(self, method, url, body=None, headers=None, timeout=30, on_connect=None):
+        """Send a request and return (connection, response) unread.
+
+        The caller must read the response and hand the connection back
+        with release(). A pooled socket the server had already closed is
+        retried on a fresh connection (see STALE_ERRORS). `on_connect` is called with the connected socket before the request
+        is sent, so another thread can abort a long wait for the response.
+        """
+        path = self._path(url)
+        while True:
+            conn, reused = self.acquire(url, timeout)
+            sent = conn.status_read = False
+            try:
+                if conn.sock is None:
+                    conn.connect()
+                if on_connect:
+                    on_connect(conn)
+                conn.request(method, path, body=body, headers=headers or {})
+                sent = True
+                return conn, conn.getresponse()
+            except STALE_ERRORS:
+                conn.close()
+                if not reused or (sent and (conn.status_read or conn.idle_for < self.stale_after)):
+                    raise
+                with self.lock:
+                    self.stats["retried"] += 1
+            except Exception:
+                conn.close()
+                raise
+
+    def request(self, method, url, body=None, headers=None, timeout=30):
+        """Perform a request and return the body, raising HTTPError on non-2xx."""
+        conn, response = self.open(method, url, body, headers, timeout)
+        try:
+            data = response.read()
+        except Exception:
+            conn.close()
+            raise
+        self.release(conn, reuse=not response.will_close)
+        if not 200 <= response.status < 300:
+            raise HTTPError(response.status, response.reason, data, dict(response.getheaders()))
+        return data
+
+    def close(self):
+        with self.lock:
+            for stack in self.idle.values():
+                for conn, _ in stack:
+                    conn.close()
+            self.idle.clear()
@@ -0,0 +1,211 @@
+"""
+bot_idle.py - Low-overhead idle detection without spawning processes
+"""
+import os
+import sys
+import threading
+
+class ProcStatSampler:
+    """Linux: CPU busy % from /proc/stat deltas, free memory from /proc/meminfo."""
+
+    def __init__(self):
+        self.last = None
+
+    @staticmethod
+    def available():
+        return os.path.exists("/proc/stat")
+
+    def cpu(self):
+        with open("/proc/stat", "r") as f:
+            fields = [int(v) for v in f.readline().split()[1:]]
+        idle = fields[3] + (fields[4] if len(fields) > 4 else 0)  # idle + iowait
+        total = sum(fields[:8])
+        last, self.last = self.last, (idle, total)
+        if last is None or total == last[1]:
+            return None
+        return 100.0 * (1 - (idle - last[0]) / (total - last[1]))
+
+    def memory_free(self):
+        info = {}
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                info[name] = int(value.split()[0])
+        if "MemAvailable" not in info or not info.get("MemTotal"):
+            return None
+        return 100.0 * info["MemAvailable"] / info["MemTotal"]
+
+class WindowsSampler:
+    """Windows: GetSystemTimes / GlobalMemoryStatusEx through ctypes (replaces wmic)."""
+
+    def __init__(self):
+        import ctypes
+        from ctypes import wintypes
+        self.ctypes = ctypes
+        self.kernel32 = ctypes.windll.kernel32
+        self.FILETIME = wintypes.FILETIME
+
+        class MEMORYSTATUSEX(ctypes.Structure):
+            _fields_ = [("dwLength", wintypes.DWORD), ("dwMemoryLoad", wintypes.DWORD),
+                        ("ullTotalPhys", ctypes.c_ulonglong), ("ullAvailPhys", ctypes.c_ulonglong),
+                        ("ullTotalPageFile", ctypes.c_ulonglong), ("ullAvailPageFile", ctypes.c_ulonglong),
+                        ("ullTotalVirtual", ctypes.c_ulonglong), ("ullAvailVirtual", ctypes.c_ulonglong),
+                        ("ullAvailExtendedVirtual", ctypes.c_ulonglong)]
+
+        self.MEMORYSTATUSEX = MEMORYSTATUSEX
+        self.last = None
+
+    @staticmethod
+    def available():
+        return sys.platform == "win32"
+
+    def cpu(self):
+        idle, kernel, user = self.FILETIME(), self.FILETIME(), self.FILETIME()
+        if not self.kernel32.GetSystemTimes(self.ctypes.byref(idle), self.ctypes.byref(kernel),
+                                            self.ctypes.byref(user)):
+            return None
+        as_int = lambda ft: (ft.dwHighDateTime << 32) | ft.dwLowDateTime
+        # Kernel time includes idle time
+        sample = (as_int(idle), as_int(kernel) + as_int(user))
+        last, self.last = self.last, sample
+        if last is None or sample[1] == last[1]:
+            return None
+        return 100.0 * (1 - (sample[0] - last[0]) / (sample[1] - last[1]))
+
+    def memory_free(self):
+        status = self.MEMORYSTATUSEX()
+        status.dwLength = self.ctypes.sizeof(status)
+        if not self.kernel32.GlobalMemoryStatusEx(self.ctypes.byref(status)):
+            return None
+        return 100.0 - status.dwMemoryLoad
+
+class LoadAvgSampler:
+    """Other Unix: 1-minute load average scaled by CPU count."""
+
+    @staticmethod
+    def available():
+        return hasattr(os, "getloadavg")
+
+    def cpu(self):
+        return min(100.0, 100.0 * os.getloadavg()[0] / (os.cpu_count() or 1))
+
+    def memory_free(self):
+        return None
+
+def default_sampler():
+    for cls in (ProcStatSampler, WindowsSampler, LoadAvgSampler):
+        if cls.available():
+            try:
+                return cls()
+            except Exception:
+                continue
+    return None
+
+class IdleDetector:
+    """Samples CPU load in the background and tracks an idle/busy state.
+
+    The raw load is smoothed with an exponential moving average. The machine
+    becomes idle when the average drops below `threshold` and only turns busy
+    again once it rises above `threshold + hysteresis`, so the bot doesn't
+    flap around the limit. Free memory below `min_free_memory` percent also
+    counts as busy. Waiters are woken on the idle transition itself rather
+    than on a polling tick.
+    """
+
+    def __init__(self, threshold=40, hysteresis=10, smoothing=0.3, interval=2,
+                 min_free_memory=10, sampler=None, logger=None, metrics=None):
+        self.threshold = threshold
+        self.hysteresis = hysteresis
+        self.smoothing = smoothing
+        self.interval = interval
+        self.min_free_memory = min_free_memory
+        self.sampler = sampler if sampler is not None else default_sampler()
+        self.logger = logger
+        self.metrics = metrics
+        self.load = None
+        self.memory_free = None
+        self.idle = True
+        self.cond = threading.Condition()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    @classmethod
+    def from_config(cls, config, logger=None, metrics=None):
+        return cls(float(config.get("idle_threshold", 40)),
+                   float(config.get("idle_hysteresis", 10)),
+                   float(config.get("idle_smoothing", 0.3)),
+                   float(config.get("idle_sample_interval", 2)),
+                   float(config.get("idle_min_free_memory", 10)),
+                   logger=logger, metrics=metrics)
+
+    def sample(self):
+        """Take one measurement and update the idle state."""
+        if self.sampler is None:
+            return
+        try:
+            cpu = self.sampler.cpu()
+            memory_free = self.sampler.memory_free()
+        except Exception:
+            return
+        with self.cond:
+            if cpu is not None:
+                if self.load is None:
+                    self.load = cpu
+                else:
+                    self.load = self.smoothing * cpu + (1 - self.smoothing) * self.load
+            self.memory_free = memory_free
+            was_idle = self.idle
+            low_memory = memory_free is not None and memory_free < self.min_free_memory
+            if self.load is not None:
+                if was_idle:
+                    self.idle = not low_memory and self.load <= self.threshold + self.hysteresis
+                else:
+                    self.idle = not low_memory and self.load < self.threshold
+            if self.idle != was_idle:
+                self.cond.notify_all()
+                if self.logger:
+                    if self.idle:
+                        self.logger.log("System", f"System idle ({self.load:.0f}% CPU)")
+                    else:
+                        reason = "low memory" if low_memory else f"{self.load:.0f}% CPU"
+                        self.logger.log("System", f"System Busy ({reason}). Waiting for idle...")
+        if self.metrics:
+            if self.load is not None:
+                self.metrics.gauge("cpu_load", round(self.load, 1))
+            if memory_free is not None:
+                self.metrics.gauge("memory_free", round(memory_free, 1))
+            self.metrics.gauge("idle", int(self.idle))
+
+    def loop(self):
+        while not self.stop_event.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.sample()  # prime the CPU counters
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        with self.cond:
+            self.cond.notify_all()
+
+    def is_idle(self):
+        with self.cond:
+            return self.idle
+
+    def wait_idle(self, stop_event, timeout=None):
+        """Block until the machine is idle; False if stopped or timed out first."""
+        with self.cond:
+            while not self.idle:
+                if stop_event.is_set():
+                    return False
+                # Short waits so a stop request is noticed promptly
+                if not self.cond.wait(1) and timeout is not None:
+                    timeout -= 1
+                    if timeout <= 0:
+                        return False
+            return not stop_event.is_set()
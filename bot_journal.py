@@ -0,0 +1,151 @@
+"""
+bot_journal.py - Write-ahead journal of pipeline jobs for crash recovery
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# A job's steps in order; "dropped" ends a job that will not be committed
+STEPS = ("planned", "written", "committed", "pushed")
+FINISHED = ("pushed", "dropped")
+
+# Journals whose lock this process holds. A forked child (the validator's
+# process pool) would share the lock and keep it after the bot crashed, so
+# it closes its copy: that doesn't release the parent's lock.
+held = set()
+
+def close_inherited():
+    for journal in list(held):
+        journal.lock_file.close()
+        journal.lock_file = None
+    held.clear()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=close_inherited)
+
+def file_hash(path):
+    """sha256 of a file's content, or None if it can't be read."""
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+class JobJournal:
+    """Append-only JSON-lines log of every job step, fsynced per record.
+
+    Each record carries the job id and the fields known at that step
+    (project folder, filename and prompt when planned; the file's sha256
+    when written). Replaying it after a crash gives each unfinished job's
+    last durable step, so the bot resumes there instead of asking the
+    LLMs again. Finished jobs are dropped when the journal is compacted.
+
+    Only the process holding `<path>.lock` may replay, compact or append:
+    open() takes the lock (released by close() or the process dying) and
+    loads the journal; constructing a JobJournal touches nothing on disk.
+    """
+
+    def __init__(self, path="jobs.journal"):
+        self.path = path
+        self.lock = threading.Lock()
+        self.jobs = {}  # id -> merged fields of all its records
+        self.lock_file = None
+
+    def open(self):
+        """Lock and load the journal; False if another process holds it."""
+        if not self.path:
+            return True
+        f = open(f"{self.path}.lock", "a+")
+        try:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            f.close()
+            return False
+        # The owner's pid, for the message of a process that finds it locked
+        f.seek(0)
+        f.truncate()
+        f.write(f"{os.getpid()}\n")
+        f.flush()
+        self.lock_file = f
+        held.add(self)
+        self.load()
+        return True
+
+    def owner(self):
+        """pid written by the process holding the lock, if readable."""
+        try:
+            with open(f"{self.path}.lock", "r") as f:
+                return int(f.read().strip() or 0) or None
+        except (OSError, ValueError):
+            return None
+
+    def close(self):
+        if self.lock_file:
+            held.discard(self)
+            self.lock_file.close()  # closing the descriptor releases the lock
+            self.lock_file = None
+
+    def load(self):
+        jobs = {}
+        if self.path and os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line of a crash
+                    jobs.setdefault(record["id"], {}).update(record)
+        with self.lock:
+            self.jobs = jobs
+        self.compact()
+        return self
+
+    def record(self, job_id, step, **fields):
+        if not self.lock_file:
+            return
+        record = {"id": job_id, "step": step, "time": time.time(), **fields}
+        line = json.dumps(record) + "\n"
+        with self.lock:
+            self.jobs.setdefault(job_id, {}).update(record)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def pending(self):
+        """Unfinished jobs (merged records), oldest first."""
+        with self.lock:
+            jobs = [dict(j) for j in self.jobs.values() if j["step"] not in FINISHED]
+        return sorted(jobs, key=lambda j: j["time"])
+
+    def pushed(self):
+        """Mark every committed job as pushed (finished)."""
+        for job in self.pending():
+            if job["step"] == "committed":
+                self.record(job["id"], "pushed")
+
+    def compact(self):
+        """Rewrite the journal with only the unfinished jobs."""
+        if not self.lock_file:
+            return
+        with self.lock:
+            self.jobs = {i: j for i, j in self.jobs.items() if j["step"] not in FINISHED}
+            data = "".join(json.dumps(j) + "\n" for j in self.jobs.values())
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
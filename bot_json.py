@@ -0,0 +1,129 @@
+"""
+bot_json.py - Tolerant JSON extraction from LLM responses
+"""
+import json
+
+CLOSERS = {"{": "}", "[": "]"}
+
+class JSONExtractor:
+    """Finds complete JSON objects/arrays in text that may arrive in pieces.
+
+    Brackets inside strings are ignored, so prose with braces before or
+    after the JSON doesn't swallow it the way a greedy regex does.
+    """
+
+    def __init__(self):
+        self.buffer = []
+        self.stack = []  # closers expected for the open brackets
+        self.in_string = False
+        self.escape = False
+
+    def feed(self, text):
+        """Consume a chunk; returns the values completed by it."""
+        found = []
+        for ch in text:
+            if not self.stack:
+                if ch in CLOSERS:
+                    self.buffer = [ch]
+                    self.stack = [CLOSERS[ch]]
+                continue
+            self.buffer.append(ch)
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch in CLOSERS:
+                self.stack.append(CLOSERS[ch])
+            elif ch in "}]":
+                if ch != self.stack.pop():
+                    self.stack = []  # mismatched, so it wasn't JSON
+                elif not self.stack:
+                    try:
+                        found.append(json.loads("".join(self.buffer)))
+                    except ValueError:
+                        pass
+        return found
+
+    def close(self, schema=None):
+        """Best-effort repair of a value cut off by the end of the text
+        (truncated response or budget), or None."""
+        if not self.stack:
+            return None
+        return repair("".join(self.buffer), schema)
+
+def repair(text, schema=None):
+    """Close an unterminated JSON prefix: finish the open string, drop a
+    dangling comma, then close the open brackets. Backs off one element
+    at a time while the tail can't be completed or doesn't match `schema`
+    (e.g. a half-written last list entry)."""
+    for _ in range(100):
+        state = JSONExtractor()
+        state.feed(text)
+        candidate = text[:-1] if state.escape else text
+        if state.in_string:
+            candidate += '"'
+        candidate = candidate.rstrip().rstrip(",")
+        if candidate.endswith(":"):
+            candidate += "null"
+        candidate += "".join(reversed(state.stack))
+        try:
+            value = json.loads(candidate)
+            if conforms(value, schema):
+                return value
+        except ValueError:
+            pass
+        cut = text.rfind(",")
+        if cut <= 0:
+            return None
+        text = text[:cut]
+    return None
+
+def conforms(value, schema):
+    """Check `value` against the subset of JSON/Gemini schema the bot uses:
+    type, properties, required and items."""
+    if not schema:
+        return True
+    kind = schema.get("type", "").lower()
+    if kind == "object":
+        if not isinstance(value, dict):
+            return False
+        if any(key not in value for key in schema.get("required", [])):
+            return False
+        return all(conforms(value[key], sub) for key, sub in schema.get("properties", {}).items()
+                   if key in value)
+    if kind == "array":
+        return isinstance(value, list) and all(conforms(v, schema.get("items")) for v in value)
+    if kind == "string":
+        return isinstance(value, str)
+    if kind == "integer":
+        return isinstance(value, int) and not isinstance(value, bool)
+    if kind == "number":
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if kind == "boolean":
+        return isinstance(value, bool)
+    return True
+
+def extract(text, schema=None):
+    """First JSON value in `text` matching `schema`, as (value, repaired);
+    (None, False) if there is none. Falls back to repairing a truncated
+    value and to rescanning from later brackets when prose opened one."""
+    start = 0
+    for _ in range(20):
+        extractor = JSONExtractor()
+        for value in extractor.feed(text[start:]):
+            if conforms(value, schema):
+                return value, False
+        value = extractor.close(schema)
+        if value is not None:
+            return value, True
+        # An unbalanced bracket in prose may have hidden the JSON after it
+        first = min((i for i in (text.find("{", start), text.find("[", start)) if i >= 0), default=-1)
+        if first < 0:
+            break
+        start = first + 1
+    return None, False
@@ -0,0 +1,120 @@
+"""
+bot_logbus.py - Fixed-size log ring buffer with independent subscribers
+"""
+import os
+import threading
+import collections
+
+LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40, "critical": 50}
+
+def level_of(role):
+    """Log level implied by a Logger role ("Error", "Warning", "CRITICAL", ...)."""
+    return LEVELS.get(role.lower(), LEVELS["info"])
+
+class Subscription:
+    """A reader's cursor into the bus. Entries it fell too far behind on are
+    counted in `dropped` instead of being kept around for it."""
+
+    def __init__(self, bus, level="info", cursor=0):
+        self.bus = bus
+        self.min_level = LEVELS.get(level, LEVELS["info"])
+        self.cursor = cursor
+        self.dropped = 0
+
+    def drain(self, limit=None):
+        """Entries published since the last drain, oldest first."""
+        return self.bus.read(self, limit)
+
+    def wait(self, timeout=None):
+        """Block until something newer than the cursor is published."""
+        with self.bus.cond:
+            if self.bus.seq <= self.cursor:
+                self.bus.cond.wait(timeout)
+            return self.bus.seq > self.cursor
+
+class LogBus:
+    """Keeps the last `capacity` entries; memory stays flat however long the
+    bot runs or however far a reader lags. Entries carrying an `event`
+    reach every subscriber regardless of its level."""
+
+    def __init__(self, capacity=2000):
+        self.entries = collections.deque(maxlen=capacity)
+        self.cond = threading.Condition()
+        self.seq = 0
+
+    def publish(self, entry):
+        with self.cond:
+            self.seq += 1
+            entry["seq"] = self.seq
+            entry.setdefault("level", level_of(entry.get("role", "")))
+            self.entries.append(entry)
+            self.cond.notify_all()
+
+    def subscribe(self, level="info", backlog=True):
+        """New reader; `backlog=False` skips what is already buffered."""
+        with self.cond:
+            start = 0 if backlog else self.seq
+        return Subscription(self, level, start)
+
+    def read(self, sub, limit=None):
+        with self.cond:
+            if not self.entries or self.seq <= sub.cursor:
+                return []
+            oldest = self.entries[0]["seq"]
+            if sub.cursor < oldest - 1:
+                sub.dropped += oldest - 1 - sub.cursor
+                sub.cursor = oldest - 1
+            # Sequence numbers are contiguous, so the cursor maps to an index
+            pending = list(self.entries)[sub.cursor - oldest + 1:]
+            if limit is not None:
+                pending = pending[:limit]
+            if pending:
+                sub.cursor = pending[-1]["seq"]
+        return [e for e in pending if e["level"] >= sub.min_level or e.get("event")]
+
+class FileSink:
+    """Appends bus entries to a log file from a background thread, rotating
+    once to `<path>.1` when the file passes `max_bytes`."""
+
+    def __init__(self, bus, path="debug.log", level="info", max_bytes=5 * 1024 * 1024):
+        self.sub = bus.subscribe(level, backlog=False)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=5)
+            self.thread = None
+        self.flush()
+
+    def loop(self):
+        while not self.stop_event.is_set():
+            self.sub.wait(1)
+            self.flush()
+
+    def flush(self):
+        dropped = self.sub.dropped
+        entries = self.sub.drain()
+        if not entries and dropped == self.sub.dropped:
+            return
+        lines = [f"[{e['time']}] " + (f"{e['source']} " if e.get("source") else "") +
+                 f"{e['role']}: {e['message']}\n" for e in entries]
+        if self.sub.dropped > dropped:
+            lines.insert(0, f"... {self.sub.dropped - dropped} log entries dropped\n")
+        try:
+            if os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+                os.replace(self.path, self.path + ".1")
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.writelines(lines)
+        except OSError:
+            pass
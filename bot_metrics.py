@@ -0,0 +1,155 @@
+"""
+bot_metrics.py - Stage timings, counters and their JSON / Prometheus export
+"""
+import os
+import json
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+class Metrics:
+    """Thread-safe registry of stage latencies, counters and gauges.
+
+    Percentiles are computed over the last `window` samples of each stage;
+    counts and totals cover the whole process lifetime.
+    """
+
+    def __init__(self, window=500):
+        self.window = window
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.totals = {}
+        self.counters = {}
+        self.gauges = {}
+        self.started = time.time()
+
+    @contextmanager
+    def span(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            self.samples.setdefault(stage, deque(maxlen=self.window)).append(seconds)
+            total = self.totals.setdefault(stage, [0, 0.0])
+            total[0] += 1
+            total[1] += seconds
+
+    def incr(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    def snapshot(self):
+        with self.lock:
+            stages = {}
+            for stage, values in self.samples.items():
+                count, total = self.totals[stage]
+                stages[stage] = {
+                    "count": count,
+                    "total_seconds": round(total, 4),
+                    "p50": round(percentile(values, 50), 4),
+                    "p90": round(percentile(values, 90), 4),
+                    "p99": round(percentile(values, 99), 4),
+                    "max": round(max(values), 4),
+                }
+            return {
+                "timestamp": time.time(),
+                "uptime_seconds": round(time.time() - self.started, 1),
+                "stages": stages,
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+            }
+
+    def prometheus(self):
+        snap = self.snapshot()
+        lines = ["# TYPE gitbot_stage_seconds summary"]
+        for stage, s in sorted(snap["stages"].items()):
+            for q, key in (("0.5", "p50"), ("0.9", "p90"), ("0.99", "p99")):
+                lines.append(f'gitbot_stage_seconds{{stage="{stage}",quantile="{q}"}} {s[key]}')
+            lines.append(f'gitbot_stage_seconds_sum{{stage="{stage}"}} {s["total_seconds"]}')
+            lines.append(f'gitbot_stage_seconds_count{{stage="{stage}"}} {s["count"]}')
+        for name, value in sorted(snap["counters"].items()):
+            lines.append(f"# TYPE gitbot_{name}_total counter")
+            lines.append(f"gitbot_{name}_total {value}")
+        for name, value in sorted(snap["gauges"].items()):
+            lines.append(f"# TYPE gitbot_{name} gauge")
+            lines.append(f"gitbot_{name} {value}")
+        lines.append(f"gitbot_uptime_seconds {snap['uptime_seconds']}")
+        return "\n".join(lines) + "\n"
+
+class MetricsExporter:
+    """Rewrites a JSON snapshot every `interval` seconds and optionally
+    serves Prometheus text on http://127.0.0.1:<port>/metrics."""
+
+    def __init__(self, metrics, path="metrics.json", interval=30, port=0):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.port = port
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.server = None
+
+    def write(self):
+        if not self.path:
+            return
+        tmp = f"{self.path}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(self.metrics.snapshot(), f, indent=2)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+    def loop(self):
+        while not self.stop_event.wait(self.interval):
+            self.write()
+
+    def start(self):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+        self.thread.start()
+        if self.port:
+            from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+            metrics = self.metrics
+
+            class Handler(BaseHTTPRequestHandler):
+                def log_message(self, *args):
+                    pass
+
+                def do_GET(self):
+                    if self.path.split("?")[0] not in ("/", "/metrics"):
+                        self.send_error(404)
+                        return
+                    body = metrics.prometheus().encode('utf-8')
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+            self.server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        self.write()
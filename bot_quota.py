@@ -0,0 +1,178 @@
+"""
+bot_quota.py - Client-side Gemini quotas: per-model token buckets that persist
+"""
+import os
+import json
+import time
+import datetime
+import threading
+
+try:
+    from zoneinfo import ZoneInfo
+    QUOTA_TZ = ZoneInfo("America/Los_Angeles")  # Gemini daily quotas reset at Pacific midnight
+except Exception:
+    QUOTA_TZ = datetime.timezone(datetime.timedelta(hours=-8))
+
+def quota_day(now):
+    return datetime.datetime.fromtimestamp(now, QUOTA_TZ).strftime("%Y-%m-%d")
+
+def next_reset(now):
+    """Epoch seconds of the next daily quota reset."""
+    local = datetime.datetime.fromtimestamp(now, QUOTA_TZ)
+    midnight = datetime.datetime.combine(local.date() + datetime.timedelta(days=1),
+                                         datetime.time(), QUOTA_TZ)
+    return midnight.timestamp()
+
+def quota_violations(error):
+    """(quotaId, quotaValue) pairs from a 429's QuotaFailure details."""
+    body = getattr(error, "body", b"") or b""
+    if isinstance(body, bytes):
+        body = body.decode('utf-8', 'replace')
+    try:
+        details = json.loads(body).get("error", {}).get("details", [])
+    except (ValueError, AttributeError):
+        return []
+    found = []
+    for detail in details:
+        for violation in detail.get("violations", []) if isinstance(detail, dict) else []:
+            value = str(violation.get("quotaValue", ""))
+            found.append((violation.get("quotaId", ""), int(value) if value.isdigit() else None))
+    return found
+
+class TokenBucket:
+    """`rate` units per minute, bursting up to `rate`. Taking more than is
+    left puts the bucket in debt, so big requests push the next one back."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.level = float(rate)
+        self.updated = time.time()
+
+    def refill(self, now):
+        self.level = min(self.rate, self.level + (now - self.updated) * self.rate / 60.0)
+        self.updated = now
+
+    def wait_time(self, now, amount=1):
+        if not self.rate:
+            return 0.0
+        self.refill(now)
+        missing = min(amount, self.rate) - self.level
+        return max(0.0, missing * 60.0 / self.rate)
+
+    def take(self, now, amount=1):
+        if self.rate:
+            self.refill(now)
+            self.level -= amount
+
+class QuotaManager:
+    """Tracks requests/min, tokens/min and requests/day per Gemini model.
+
+    Limits come from the `gemini_quotas` config ("default" plus per-model
+    overrides, 0 = unlimited), lowered by what 429 responses report. Day
+    counts, learned limits and server-imposed pauses are saved to `path`
+    so a restart doesn't burn through a quota that is already spent.
+    """
+
+    def __init__(self, limits=None, path="gemini_quota.json", logger=None, metrics=None):
+        self.limits = limits or {}
+        self.path = path
+        self.logger = logger
+        self.metrics = metrics
+        self.lock = threading.Lock()
+        self.buckets = {}  # model -> (requests bucket, tokens bucket)
+        self.state = {"day": quota_day(time.time()), "models": {}}
+        self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        if isinstance(state.get("models"), dict):
+            self.state = state
+        self.roll_day(time.time())
+
+    def save(self):
+        if not self.path:
+            return
+        with self.lock:
+            data = json.dumps(self.state)
+        tmp = f"{self.path}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                f.write(data)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+    def roll_day(self, now):
+        day = quota_day(now)
+        if self.state.get("day") != day:
+            self.state["day"] = day
+            for entry in self.state["models"].values():
+                entry["requests"] = 0
+
+    def entry(self, model):
+        return self.state["models"].setdefault(model, {"requests": 0, "blocked_until": 0, "learned": {}})
+
+    def limit(self, model, name):
+        configured = {**self.limits.get("default", {}), **self.limits.get(model, {})}.get(name, 0)
+        learned = self.entry(model)["learned"].get(name, 0)
+        return min(v for v in (configured, learned) if v) if configured or learned else 0
+
+    def bucket(self, model):
+        rpm, tpm = self.limit(model, "rpm"), self.limit(model, "tpm")
+        pair = self.buckets.get(model)
+        if pair is None or (pair[0].rate, pair[1].rate) != (rpm, tpm):
+            pair = self.buckets[model] = (TokenBucket(rpm), TokenBucket(tpm))
+        return pair
+
+    def wait_time(self, model, now=None):
+        """Seconds until `model` may take another request (0 = now)."""
+        now = now or time.time()
+        with self.lock:
+            self.roll_day(now)
+            entry = self.entry(model)
+            requests, tokens = self.bucket(model)
+            waits = [entry["blocked_until"] - now, requests.wait_time(now), tokens.wait_time(now)]
+            rpd = self.limit(model, "rpd")
+            if rpd and entry["requests"] >= rpd:
+                waits.append(next_reset(now) - now)
+        return max(0.0, *waits)
+
+    def record(self, model, tokens):
+        """Count one request that reached the server and its token usage."""
+        now = time.time()
+        with self.lock:
+            self.roll_day(now)
+            self.entry(model)["requests"] += 1
+            requests, token_bucket = self.bucket(model)
+            requests.take(now)
+            token_bucket.take(now, tokens)
+        self.save()
+
+    def rate_limited(self, model, error, delay=None):
+        """Apply a 429: learn the limits it names and pause the model until
+        the server's retry delay or, for daily quotas, the next reset."""
+        now = time.time()
+        until = now + (delay or 60)
+        with self.lock:
+            entry = self.entry(model)
+            for quota_id, value in quota_violations(error):
+                name = "rpd" if "PerDay" in quota_id else "tpm" if "Token" in quota_id else "rpm"
+                if value:
+                    entry["learned"][name] = value
+                if name == "rpd":
+                    until = max(until, next_reset(now))
+                    entry["requests"] = max(entry["requests"], value or 0)
+            entry["blocked_until"] = max(entry["blocked_until"], until)
+        if self.metrics:
+            self.metrics.incr("gemini_quota_pauses")
+        if self.logger:
+            resume = datetime.datetime.fromtimestamp(until).strftime("%H:%M:%S")
+            self.logger.log("Warning", f"Gemini quota for {model} exhausted, next request at {resume}")
+        self.save()
+        return until - now
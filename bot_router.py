@@ -0,0 +1,177 @@
+"""
+bot_router.py - Picks the Gemini model per request from observed latency and errors
+"""
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import threading
+
+class ModelStats:
+    def __init__(self, rank):
+        self.rank = rank
+        self.latency = {}  # kind -> EMA seconds
+        self.outcomes = []  # last WINDOW successes (True) / failures (False)
+        self.failures = 0  # consecutive
+        self.open_until = 0
+        self.rate_limited = False
+
+    def error_rate(self):
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+class ModelRouter:
+    """Routes each Gemini request to the fastest healthy model for its kind
+    ("ideation" or "task").
+
+    Models are scored by their latency moving average, inflated by recent
+    error rate. A model without a sample for that kind borrows the best
+    score, so a higher-priority model gets tried before settling. Failures
+    open a circuit with exponential backoff and jitter: 1s doubling for
+    plain errors, 30s doubling (or the server's retry delay) for 429/quota.
+    With a QuotaManager (bot_quota), models without quota left are skipped
+    until the moment their buckets allow the next request.
+    """
+    WINDOW = 20
+    SMOOTHING = 0.3
+
+    def __init__(self, logger=None, metrics=None, quota=None):
+        self.logger = logger
+        self.metrics = metrics
+        self.quota = quota
+        self.lock = threading.Lock()
+        self.models = {}
+        self.ready = threading.Event()  # set once a model list is installed
+
+    def set_models(self, candidates):
+        """Install the ranked model list, keeping stats of known models."""
+        with self.lock:
+            models = {}
+            for rank, model in enumerate(candidates):
+                models[model] = self.models.get(model) or ModelStats(rank)
+                models[model].rank = rank
+            self.models = models
+        self.ready.set()
+
+    def pick(self, kind):
+        """Best model for `kind`, or None while every circuit is open."""
+        now = time.time()
+        with self.lock:
+            ready = [(m, s) for m, s in self.models.items() if s.open_until <= now
+                     and (self.quota is None or self.quota.wait_time(m, now) <= 0)]
+            if not ready:
+                return None
+            scores = {m: s.latency[kind] * (1 + 2 * s.error_rate())
+                      for m, s in ready if kind in s.latency}
+            best = min(scores.values()) if scores else 0.0
+            return min(ready, key=lambda item: (scores.get(item[0], best), item[1].rank))[0]
+
+    def wait_time(self):
+        """Seconds until some model can be used again: its circuit closed
+        and its quota refilled (at least 0.1, at most 60)."""
+        now = time.time()
+        with self.lock:
+            if not self.models:
+                return 5
+            soonest = min(max(s.open_until - now, self.quota.wait_time(m, now) if self.quota else 0)
+                          for m, s in self.models.items())
+        return min(60.0, max(0.1, soonest))
+
+    def record(self, model, kind, latency, error=None, tokens=0):
+        """Report one request; `error` is the exception raised, if any, and
+        `tokens` its total token usage."""
+        quota_delay = None
+        if self.quota:
+            if error is not None and is_rate_limited(error):
+                quota_delay = self.quota.rate_limited(model, error, retry_delay(error))
+            elif error is None or getattr(error, "status", None) is not None:
+                self.quota.record(model, tokens)  # it reached the server, so it counts
+        with self.lock:
+            stats = self.models.get(model)
+            if stats is None:
+                stats = self.models[model] = ModelStats(len(self.models))
+            stats.outcomes = (stats.outcomes + [error is None])[-self.WINDOW:]
+            if error is None:
+                previous = stats.latency.get(kind)
+                stats.latency[kind] = latency if previous is None else \
+                    self.SMOOTHING * latency + (1 - self.SMOOTHING) * previous
+                if stats.failures and self.logger:
+                    self.logger.log("Gemini", f"Model {model} recovered")
+                stats.failures = 0
+                stats.open_until = 0
+                stats.rate_limited = False
+            else:
+                stats.failures += 1
+                delay = quota_delay or retry_delay(error)
+                stats.rate_limited = is_rate_limited(error)
+                if delay is None:
+                    base = 30 if stats.rate_limited else 1
+                    delay = min(3600 if stats.rate_limited else 300,
+                                base * 2 ** (stats.failures - 1))
+                delay *= random.uniform(0.8, 1.2)
+                stats.open_until = time.time() + delay
+                if self.logger:
+                    reason = "rate limited" if stats.rate_limited else "failing"
+                    self.logger.log("Warning", f"Model {model} {reason}, resting for {delay:.0f}s")
+            healthy = sum(1 for s in self.models.values() if s.open_until <= time.time())
+        if self.metrics:
+            self.metrics.gauge("gemini_models_healthy", healthy)
+            if error is not None and is_rate_limited(error):
+                self.metrics.incr("gemini_rate_limited")
+
+def is_rate_limited(error):
+    if getattr(error, "status", None) == 429:
+        return True
+    body = getattr(error, "body", b"") or b""
+    if isinstance(body, bytes):
+        body = body.decode('utf-8', 'replace')
+    return "RESOURCE_EXHAUSTED" in body or "quota" in body.lower()
+
+def retry_delay(error):
+    """Server-provided delay in seconds (Retry-After or Gemini's retryDelay)."""
+    headers = getattr(error, "headers", None) or {}
+    value = headers.get("Retry-After") or headers.get("retry-after")
+    if value and value.strip().isdigit():
+        return float(value)
+    body = getattr(error, "body", b"") or b""
+    if isinstance(body, bytes):
+        body = body.decode('utf-8', 'replace')
+    match = re.search(r'"retryDelay"\s*:\s*"(\d+(?:\.\d+)?)s"', body)
+    return float(match.group(1)) if match else None
+
+class ModelListCache:
+    """`list_models` results kept on disk so a restart skips the request."""
+
+    def __init__(self, path="gemini_models.json", ttl=86400):
+        self.path = path
+        self.ttl = ttl
+
+    @staticmethod
+    def owner(base_url, api_key):
+        # Never store the key itself
+        return hashlib.sha256(f"{base_url}|{api_key}".encode('utf-8')).hexdigest()[:16]
+
+    def get(self, base_url, api_key):
+        if not self.path or not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("owner") != self.owner(base_url, api_key) or time.time() - data.get("fetched", 0) > self.ttl:
+            return None
+        return data.get("models") or None
+
+    def put(self, base_url, api_key, models):
+        if not self.path:
+            return
+        tmp = f"{self.path}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump({"owner": self.owner(base_url, api_key), "fetched": time.time(),
+                           "models": models}, f)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
@@ -0,0 +1,137 @@
+"""
+bot_scheduler.py - Routes coding jobs across Ollama endpoints and model slots
+"""
+import time
+import threading
+
+def endpoint_specs(config):
+    """(url, model, concurrency) for each entry of `ollama_endpoints`.
+
+    Missing fields fall back to `ollama_url` / `model` and a concurrency
+    of 1; an empty list means the single default endpoint.
+    """
+    default_url = config.get("ollama_url", "http://localhost:11434/api/generate")
+    return [(spec.get("url", default_url), spec.get("model", config.get("model")),
+             max(1, int(spec.get("concurrency", 1))))
+            for spec in (config.get("ollama_endpoints") or [{}])]
+
+class Endpoint:
+    """One Ollama server/model pair with `concurrency` client slots."""
+
+    def __init__(self, url, model, concurrency, make_client):
+        self.url = url
+        self.model = model
+        self.concurrency = concurrency
+        self.clients = [make_client(url, model) for _ in range(self.concurrency)]
+        self.idle_clients = list(self.clients)
+        self.active = 0
+        self.failures = 0
+        self.unhealthy_until = 0
+        self.last_used = 0
+        self.completed = 0
+
+    @property
+    def name(self):
+        return f"{self.model}@{self.url}"
+
+    def healthy(self, now):
+        return now >= self.unhealthy_until
+
+    def load(self):
+        return self.active / self.concurrency
+
+class OllamaScheduler:
+    """Least-loaded routing with per-endpoint concurrency limits.
+
+    A failing endpoint is taken out of rotation with exponential backoff
+    (5s doubling up to 5 minutes) and returns after its first success.
+    Among equally loaded endpoints the most recently used one wins, since
+    its model is the most likely to still be resident.
+    """
+
+    def __init__(self, config, logger, make_client, metrics=None):
+        """`make_client(url, model)` builds one OllamaClient per slot."""
+        self.logger = logger
+        self.metrics = metrics
+        self.idle = None
+        self.cond = threading.Condition()
+        self.endpoints = [Endpoint(url, model, concurrency, make_client)
+                          for url, model, concurrency in endpoint_specs(config)]
+
+    @property
+    def capacity(self):
+        return sum(e.concurrency for e in self.endpoints)
+
+    def headroom(self):
+        """Percent of CPU left according to the idle detector (100 if unknown)."""
+        if self.idle is None or self.idle.load is None:
+            return 100.0
+        return max(0.0, 100.0 - self.idle.load)
+
+    def pick(self, model=None):
+        now = time.time()
+        ready = [e for e in self.endpoints
+                 if e.idle_clients and e.healthy(now) and (model is None or e.model == model)]
+        if not ready:
+            return None
+        return min(ready, key=lambda e: (e.load(), -e.last_used))
+
+    def acquire(self, stop_event, model=None):
+        """Block until a slot is free; returns (endpoint, client) or None on stop."""
+        with self.cond:
+            while not stop_event.is_set():
+                endpoint = self.pick(model)
+                if endpoint:
+                    client = endpoint.idle_clients.pop()
+                    endpoint.active += 1
+                    endpoint.last_used = time.time()
+                    self.update_gauges()
+                    return endpoint, client
+                self.cond.wait(1)
+        return None
+
+    def try_acquire(self, avoid_models=()):
+        """Non-blocking acquire for speculative extras; prefers endpoints
+        serving a model not in `avoid_models`. Returns (endpoint, client) or None."""
+        with self.cond:
+            now = time.time()
+            ready = [e for e in self.endpoints if e.idle_clients and e.healthy(now)]
+            if not ready:
+                return None
+            endpoint = min(ready, key=lambda e: (e.model in avoid_models, e.load(), -e.last_used))
+            client = endpoint.idle_clients.pop()
+            endpoint.active += 1
+            endpoint.last_used = time.time()
+            self.update_gauges()
+            return endpoint, client
+
+    def release(self, endpoint, client, success):
+        """Return a slot; `success=None` (e.g. cancelled) leaves health untouched."""
+        with self.cond:
+            endpoint.active -= 1
+            endpoint.idle_clients.append(client)
+            if success:
+                endpoint.failures = 0
+                endpoint.unhealthy_until = 0
+                endpoint.completed += 1
+            elif success is False:
+                endpoint.failures += 1
+                backoff = min(300, 5 * 2 ** (endpoint.failures - 1))
+                endpoint.unhealthy_until = time.time() + backoff
+                self.logger.log("Warning", f"Ollama endpoint {endpoint.name} failed, "
+                                           f"resting for {backoff}s")
+            self.update_gauges()
+            self.cond.notify_all()
+
+    def cancel_all(self):
+        """Abort every in-flight generation (used by GitGardener.stop)."""
+        for endpoint in self.endpoints:
+            for client in endpoint.clients:
+                client.cancel()
+        with self.cond:
+            self.cond.notify_all()
+
+    def update_gauges(self):
+        if self.metrics:
+            self.metrics.gauge("ollama_active", sum(e.active for e in self.endpoints))
+            self.metrics.gauge("ollama_healthy", sum(1 for e in self.endpoints if e.healthy(time.time())))
@@ -0,0 +1,183 @@
+"""
+bot_state.py - In-memory project state with atomic persistence
+"""
+import os
+import json
+import time
+import threading
+
+class ProjectStore:
+    """Every project the bot has started, kept in memory and saved to one JSON file.
+
+    Projects are plain dicts (project_name, folder_name, description,
+    file_count, files) plus status/created/completed and, with batch
+    planning, the ordered file plan. Writes go to a temp
+    file that is fsynced and renamed over the old one, so a crash leaves
+    either the previous or the new state on disk, never half of it.
+
+    A completed project loses its plan and symbols, and beyond the newest
+    `keep_completed` ones it moves to an append-only archive next to the
+    file, so the file rewritten on every commit stays small.
+    """
+
+    def __init__(self, path="projects.json", legacy_path="current_project.json", logger=None,
+                 keep_completed=50):
+        self.path = path
+        self.legacy_path = legacy_path
+        self.logger = logger
+        self.keep_completed = keep_completed
+        self.archive_path = os.path.splitext(path)[0] + "_archive.jsonl"
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.projects = []
+        self.archived = set()  # folder names in the archive, still taken
+
+    def log(self, role, message):
+        if self.logger:
+            self.logger.log(role, message)
+
+    def load(self):
+        projects = []
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    projects = json.load(f)["projects"]
+            except (OSError, ValueError, KeyError) as e:
+                # Keep the bad file for inspection instead of silently starting over
+                self.log("Error", f"Unreadable {self.path} ({e}); moved to {self.path}.corrupt")
+                os.replace(self.path, self.path + ".corrupt")
+        elif self.legacy_path and os.path.exists(self.legacy_path):
+            try:
+                with open(self.legacy_path, "r") as f:
+                    legacy = json.load(f)
+                if legacy.get("folder_name"):
+                    legacy.setdefault("status", "active")
+                    projects = [legacy]
+                    self.log("System", f"Imported {self.legacy_path}")
+            except (OSError, ValueError):
+                pass
+        if os.path.exists(self.archive_path):
+            with open(self.archive_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        self.archived.add(json.loads(line)["folder_name"])
+                    except (ValueError, KeyError):
+                        continue
+        with self.lock:
+            self.projects = projects
+            for project in projects:
+                if project.get("status") == "complete":
+                    self.trim(project)
+        if self.archive() or (projects and not os.path.exists(self.path)):
+            self.save()
+        return self
+
+    @staticmethod
+    def trim(project):
+        """Drop what only an unfinished project needs."""
+        project.pop("plan", None)
+        project.pop("symbols", None)
+
+    def archive(self):
+        """Move completed projects beyond the newest `keep_completed` to the
+        archive; returns True if any were moved."""
+        with self.lock:
+            completed = [p for p in self.projects if p.get("status") == "complete"]
+            old = completed[:max(0, len(completed) - self.keep_completed)]
+            if not old:
+                return False
+            with open(self.archive_path, "a", encoding="utf-8") as f:
+                for project in old:
+                    f.write(json.dumps(project) + "\n")
+            self.archived.update(p["folder_name"] for p in old)
+            self.projects = [p for p in self.projects if not any(p is o for o in old)]
+        return True
+
+    def save(self):
+        with self.lock:
+            data = json.dumps({"projects": self.projects}, indent=1)
+        # Serialized writers; the lock above is only held while copying
+        with self.write_lock:
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            if hasattr(os, "O_DIRECTORY"):
+                try:
+                    fd = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_DIRECTORY)
+                    try:
+                        os.fsync(fd)
+                    finally:
+                        os.close(fd)
+                except OSError:
+                    pass
+
+    def add(self, project):
+        """Register a new project; the folder name is made unique if needed."""
+        with self.lock:
+            taken = {p["folder_name"] for p in self.projects} | self.archived
+            base, n = project["folder_name"], 2
+            while project["folder_name"] in taken:
+                project["folder_name"] = f"{base}_{n}"
+                n += 1
+            project.setdefault("status", "active")
+            project.setdefault("created", time.strftime("%Y-%m-%d %H:%M:%S"))
+            self.projects.append(project)
+        self.save()
+        return project
+
+    def add_file(self, project, filename, limit, symbols=None):
+        """Record a committed file (and its API summary, see bot_symbols);
+        the project is completed once it has `limit` files."""
+        with self.lock:
+            project["file_count"] = project.get("file_count", 0) + 1
+            project.setdefault("files", []).append(filename)
+            if symbols:
+                project.setdefault("symbols", {})[filename] = symbols
+            if project["file_count"] >= limit and project.get("status") != "complete":
+                project["status"] = "complete"
+                project["completed"] = time.strftime("%Y-%m-%d %H:%M:%S")
+                self.trim(project)
+        self.archive()
+        self.save()
+
+    def extend_plan(self, project, entries):
+        """Append planned files ({filename, description, code_prompt,
+        depends_on}) to the project's batch plan."""
+        with self.lock:
+            project.setdefault("plan", []).extend(entries)
+        self.save()
+
+    def drop_from_plan(self, project, filename):
+        """Remove a failed file and everything that depends on it, directly
+        or not, from the plan; returns the filenames it removed."""
+        with self.lock:
+            plan = project.get("plan", [])
+            dropped = {filename}
+            changed = True
+            while changed:
+                changed = False
+                for entry in plan:
+                    if entry["filename"] not in dropped and dropped.intersection(entry.get("depends_on", [])):
+                        dropped.add(entry["filename"])
+                        changed = True
+            project["plan"] = [e for e in plan if e["filename"] not in dropped]
+            removed = sorted(e["filename"] for e in plan if e["filename"] in dropped)
+        if removed:
+            self.save()
+        return removed
+
+    def symbols(self, project):
+        with self.lock:
+            return dict(project.get("symbols", {}))
+
+    def active(self):
+        with self.lock:
+            return [p for p in self.projects if p.get("status", "active") == "active"]
+
+    def history(self):
+        """Projects still in the file (active and recently completed)."""
+        with self.lock:
+            return list(self.projects)
@@ -0,0 +1,119 @@
+"""
+bot_stats.py - Commit accounting shared safely between bot processes
+"""
+import os
+import json
+import time
+import sqlite3
+import datetime
+import threading
+
+class DailyStats:
+    """Per-commit rows in a SQLite database (WAL mode).
+
+    Several processes (background_agent.py and the GUI, say) can count into
+    the same file: SQLite serializes the writers, and WAL lets readers go on
+    while one writes. Today's count is cached in memory and only re-queried
+    when `PRAGMA data_version` shows another connection has committed, or
+    the date has changed.
+    """
+
+    def __init__(self, filename="daily_stats.db", legacy_file="daily_stats.json"):
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(filename, timeout=30, check_same_thread=False,
+                                    isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS commits ("
+            " id INTEGER PRIMARY KEY, ts REAL, day TEXT, hour INTEGER,"
+            " model TEXT, project TEXT, filename TEXT)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS commits_day ON commits(day)")
+        self.cached = None  # (day, data_version, count)
+        if legacy_file and os.path.exists(legacy_file):
+            self.import_legacy(legacy_file)
+
+    def import_legacy(self, legacy_file):
+        """Carry over the old single-day JSON counter once.
+
+        The file is read and renamed inside the write transaction, so when
+        two processes start together only the first one imports it.
+        """
+        imported = legacy_file + ".imported"
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                with open(legacy_file, "r") as f:
+                    data = json.load(f)
+                day, count = data.get("date"), int(data.get("count", 0))
+                if day and not self.conn.execute("SELECT 1 FROM commits WHERE day = ? LIMIT 1",
+                                                 (day,)).fetchone():
+                    self.conn.executemany("INSERT INTO commits (ts, day, hour) VALUES (?, ?, NULL)",
+                                          [(time.time(), day)] * count)
+                os.replace(legacy_file, imported)
+            except FileNotFoundError:
+                self.conn.execute("ROLLBACK")  # another process imported it first
+                return
+            except (OSError, ValueError, TypeError, sqlite3.Error):
+                self.conn.execute("ROLLBACK")
+                return
+            try:
+                self.conn.execute("COMMIT")
+            except sqlite3.Error:
+                self.conn.execute("ROLLBACK")
+                os.replace(imported, legacy_file)
+
+    def get_count(self):
+        today = datetime.datetime.now().strftime("%Y-%m-%d")
+        with self.lock:
+            version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            if self.cached and self.cached[:2] == (today, version):
+                return self.cached[2]
+            count = self.conn.execute("SELECT COUNT(*) FROM commits WHERE day = ?",
+                                      (today,)).fetchone()[0]
+            self.cached = (today, version, count)
+            return count
+
+    def increment(self, model=None, project=None, filename=None):
+        """Record one commit and return today's total across all processes."""
+        now = datetime.datetime.now()
+        today = now.strftime("%Y-%m-%d")
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.execute(
+                    "INSERT INTO commits (ts, day, hour, model, project, filename) VALUES (?, ?, ?, ?, ?, ?)",
+                    (time.time(), today, now.hour, model, project, filename))
+                count = self.conn.execute("SELECT COUNT(*) FROM commits WHERE day = ?",
+                                          (today,)).fetchone()[0]
+                self.conn.execute("COMMIT")
+            except sqlite3.Error:
+                self.conn.execute("ROLLBACK")
+                raise
+            # Our own commit doesn't bump data_version, so the cache stays valid
+            version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            self.cached = (today, version, count)
+        return count
+
+    def history(self, days=30):
+        """[(day, count)] for the last `days` days that had commits, oldest first."""
+        since = (datetime.date.today() - datetime.timedelta(days=days - 1)).isoformat()
+        with self.lock:
+            return self.conn.execute(
+                "SELECT day, COUNT(*) FROM commits WHERE day >= ? GROUP BY day ORDER BY day",
+                (since,)).fetchall()
+
+    def rollup(self, by="hour", day=None):
+        """Commit counts grouped by "hour", "model" or "project" for one day (default today)."""
+        if by not in ("hour", "model", "project"):
+            raise ValueError(f"unknown rollup {by!r}")
+        day = day or datetime.datetime.now().strftime("%Y-%m-%d")
+        with self.lock:
+            return self.conn.execute(
+                f"SELECT {by}, COUNT(*) FROM commits WHERE day = ? GROUP BY {by} ORDER BY {by}",
+                (day,)).fetchall()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
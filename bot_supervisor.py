@@ -0,0 +1,196 @@
+"""
+bot_supervisor.py - Several repositories served by one process
+
+bot_supervisor.json lists the repositories; "shared" holds the settings
+every repo inherits (keys, endpoints, limits) and each entry under "repos"
+overrides them for one repo (path, repo_url, name, email, max_commits...):
+
+    {
+      "shared": {"gemini_key": "...", "ollama_endpoints": [{"concurrency": 2}]},
+      "repos": [
+        {"path": "C:/repos/garden-a", "repo_url": "https://github.com/me/a.git"},
+        {"path": "C:/repos/garden-b", "repo_url": "https://github.com/me/b.git",
+         "name": "Other Me", "email": "other@example.com", "max_commits": 5}
+      ]
+    }
+
+All gardeners share one HTTP pool, response cache, Gemini client and model
+router, idle detector, validator pool and Ollama scheduler, so each model
+is loaded once however many repos are served. Project state, daily budget,
+transcripts and git identity stay in each repo.
+
+The settings of those shared parts can only be given under "shared"; a
+repo entry that sets one is warned about and the value ignored:
+
+    gemini_key, gemini_url, gemini_models_file, gemini_models_ttl,
+    gemini_quotas, gemini_quota_file, http_max_idle, http_idle_timeout,
+    llm_cache, llm_cache_dir, llm_cache_max_mb, llm_cache_ttl,
+    log_capacity, log_file, log_file_level, metrics_file,
+    metrics_interval, metrics_port, idle_* (threshold, hysteresis,
+    smoothing, sample_interval, min_free_memory), validate,
+    validate_workers, validate_strict_imports, model, ollama_url,
+    ollama_endpoints, ollama_warmup, ollama_system, ollama_keep_alive,
+    ollama_num_ctx, ollama_max_tokens, ollama_max_bytes,
+    ollama_stall_timeout, ollama_reuse_context, engine
+
+    python bot_supervisor.py [bot_supervisor.json]
+"""
+import os
+import sys
+import json
+import time
+import threading
+
+from bot_core import (DEFAULT_CONFIG, GeminiClient, GitGardener, Logger, OllamaClient,
+                      open_cache, rank_models)
+from bot_http import ConnectionPool
+from bot_idle import IdleDetector
+from bot_logbus import FileSink, LogBus
+from bot_metrics import Metrics, MetricsExporter
+from bot_quota import QuotaManager
+from bot_router import ModelListCache, ModelRouter
+from bot_scheduler import OllamaScheduler
+from bot_validate import Validator
+
+# Read only by SharedResources and the clients it builds (see the docstring)
+SHARED_ONLY = {
+    "gemini_key", "gemini_url", "gemini_models_file", "gemini_models_ttl",
+    "gemini_quotas", "gemini_quota_file", "http_max_idle", "http_idle_timeout",
+    "llm_cache", "llm_cache_dir", "llm_cache_max_mb", "llm_cache_ttl",
+    "log_capacity", "log_file", "log_file_level", "metrics_file", "metrics_interval", "metrics_port",
+    "idle_threshold", "idle_hysteresis", "idle_smoothing", "idle_sample_interval", "idle_min_free_memory",
+    "validate", "validate_workers", "validate_strict_imports",
+    "model", "ollama_url", "ollama_endpoints", "ollama_warmup", "ollama_system", "ollama_keep_alive",
+    "ollama_num_ctx", "ollama_max_tokens", "ollama_max_bytes", "ollama_stall_timeout",
+    "ollama_reuse_context", "engine",
+}
+
+class SharedResources:
+    """Everything the gardeners of one process have in common."""
+
+    def __init__(self, config):
+        self.config = config
+        self.log_bus = LogBus(int(config.get("log_capacity", 2000)))
+        self.logger = Logger(self.log_bus, "supervisor")
+        self.log_sink = None
+        if config.get("log_file", "debug.log"):
+            self.log_sink = FileSink(self.log_bus, config.get("log_file", "debug.log"),
+                                     config.get("log_file_level", "info"))
+        self.metrics = Metrics()
+        self.exporter = MetricsExporter(self.metrics, config.get("metrics_file", "metrics.json"),
+                                        float(config.get("metrics_interval", 30)),
+                                        int(config.get("metrics_port", 0)))
+        self.pool = ConnectionPool(int(config.get("http_max_idle", 4)),
+                                   float(config.get("http_idle_timeout", 60)))
+        self.cache = open_cache(config)
+        quota_file = config.get("gemini_quota_file", "gemini_quota.json")
+        self.router = ModelRouter(self.logger, self.metrics,
+                                  QuotaManager(config.get("gemini_quotas"), quota_file or None,
+                                               self.logger, self.metrics))
+        self.gemini = GeminiClient(config["gemini_key"], self.logger, self.pool, self.cache,
+                                   config.get("gemini_url", GeminiClient.BASE_URL), self.router,
+                                   ModelListCache(config.get("gemini_models_file", "gemini_models.json"),
+                                                  float(config.get("gemini_models_ttl", 86400))))
+        self.idle = IdleDetector.from_config(config, self.logger, self.metrics)
+        self.validator = None
+        if config.get("validate", True):
+            self.validator = Validator(int(config.get("validate_workers", 2)),
+                                       bool(config.get("validate_strict_imports", False)),
+                                       self.metrics)
+
+        def make_ollama(url, model):
+            client = OllamaClient(model, self.logger, config, self.pool, self.cache)
+            client.url = url
+            return client
+        self.scheduler = OllamaScheduler(config, self.logger, make_ollama, self.metrics)
+        self.scheduler.idle = self.idle
+
+    def start(self):
+        if self.log_sink:
+            self.log_sink.start()
+        self.exporter.start()
+        self.idle.start()
+        # Gardeners' planners wait on router.ready until this lands
+        threading.Thread(target=self.discover_models, daemon=True).start()
+        if self.config.get("ollama_warmup", True):
+            for endpoint in self.scheduler.endpoints:
+                threading.Thread(target=self.warmup, args=(endpoint.clients[0],), daemon=True).start()
+
+    def discover_models(self):
+        with self.metrics.span("model_discovery"):
+            self.router.set_models(rank_models(self.gemini.list_models()))
+        self.logger.log("System", "Gemini models ready", event="models_ready")
+
+    def warmup(self, client):
+        with self.metrics.span("warmup"):
+            seconds = client.warmup()
+        if seconds is not None:
+            self.logger.log("Ollama", f"{client.model} ready at {client.url} ({seconds:.1f}s)")
+
+    def stop(self):
+        self.scheduler.cancel_all()
+        self.idle.stop()
+        self.exporter.stop()
+        if self.validator:
+            self.validator.close()
+        if self.log_sink:
+            self.log_sink.stop()
+
+class Supervisor:
+    def __init__(self, config_file="bot_supervisor.json"):
+        with open(config_file, "r") as f:
+            data = json.load(f)
+        shared_config = {**DEFAULT_CONFIG, **data.get("shared", {})}
+        if shared_config.get("engine", "threads") != "threads":
+            shared_config["engine"] = "threads"  # asyncio clients can't be shared
+        self.shared = SharedResources(shared_config)
+        self.gardeners = []
+        for repo in data.get("repos", []):
+            root = repo.get("path")
+            if not root:
+                raise ValueError("every entry in \"repos\" needs a \"path\"")
+            os.makedirs(root, exist_ok=True)
+            ignored = sorted(k for k in repo if k in SHARED_ONLY)
+            if ignored:
+                self.shared.logger.log("Warning", f"{root}: {', '.join(ignored)} can only be set under "
+                                                  f"\"shared\", ignoring the repo's value")
+            config = {**shared_config, **{k: v for k, v in repo.items() if k != "path" and k not in SHARED_ONLY}}
+            self.gardeners.append(GitGardener(None, root, self.shared, config))
+
+    def start(self):
+        self.shared.start()
+        for gardener in self.gardeners:
+            gardener.start()
+        self.shared.logger.log("System", f"Supervising {len(self.gardeners)} repositories")
+
+    def stop(self):
+        for gardener in self.gardeners:
+            gardener.stop()
+        # Cancel in-flight generations of every repo at once
+        self.shared.scheduler.cancel_all()
+        for gardener in self.gardeners:
+            if gardener.thread:
+                gardener.thread.join()
+        self.shared.stop()
+
+    @property
+    def running(self):
+        return any(g.running for g in self.gardeners)
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    supervisor = Supervisor(argv[0] if argv else "bot_supervisor.json")
+    # Mirror the shared log bus on the console
+    sub = supervisor.shared.log_bus.subscribe()
+    supervisor.start()
+    try:
+        while supervisor.running:
+            for entry in sub.drain():
+                source = f"{entry['source']} " if entry.get("source") else ""
+                print(f"[{entry['time']}] {source}{entry['role']}: {entry['message']}")
+            time.sleep(1)
+    except KeyboardInterrupt:
+        supervisor.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+bot_symbols.py - Compact summaries of a project's modules for LLM prompts
+"""
+import ast
+
+CHARS_PER_TOKEN = 4
+
+def _args(node):
+    args = [a.arg for a in node.args.posonlyargs + node.args.args]
+    if args and args[0] in ("self", "cls"):
+        args = args[1:]
+    if node.args.vararg:
+        args.append("*" + node.args.vararg.arg)
+    args += [a.arg for a in node.args.kwonlyargs]
+    if node.args.kwarg:
+        args.append("**" + node.args.kwarg.arg)
+    signature = f"{node.name}({', '.join(args)})"
+    if node.returns is not None:
+        try:
+            signature += f" -> {ast.unparse(node.returns)}"
+        except Exception:
+            pass
+    return signature
+
+def summarize(source):
+    """Top-level API of a module as short lines: classes with their public
+    methods, functions with signatures and UPPER_CASE constants."""
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return []
+    lines = []
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and not node.name.startswith("_"):
+            bases = ", ".join(ast.unparse(b) for b in node.bases)
+            methods = [_args(n) for n in node.body
+                       if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))
+                       and (not n.name.startswith("_") or n.name == "__init__")]
+            head = f"class {node.name}({bases})" if bases else f"class {node.name}"
+            lines.append(head + (": " + "; ".join(methods) if methods else ""))
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and not node.name.startswith("_"):
+            lines.append("def " + _args(node))
+        elif isinstance(node, ast.Assign):
+            names = [t.id for t in node.targets if isinstance(t, ast.Name) and t.id.isupper()]
+            lines.extend(names)
+    return lines
+
+def compact(symbols, max_tokens):
+    """Render {filename: [summary lines]} within roughly `max_tokens`.
+
+    Tries full signatures first, then bare names per module, then drops
+    whole modules (newest kept) with a count of what was left out.
+    """
+    budget = max_tokens * CHARS_PER_TOKEN
+    if not symbols or budget <= 0:
+        return ""
+
+    full = "\n".join(f"{name}: " + " | ".join(lines) for name, lines in symbols.items() if lines)
+    if len(full) <= budget:
+        return full
+
+    def names_only(lines):
+        return ", ".join(line.split("(")[0].split(":")[0].replace("def ", "") for line in lines)
+    short = [f"{name}: {names_only(lines)}" for name, lines in symbols.items() if lines]
+    kept = []
+    used = 0
+    for line in reversed(short):
+        if used + len(line) + 1 > budget:
+            break
+        kept.insert(0, line)
+        used += len(line) + 1
+    if len(kept) < len(short):
+        kept.insert(0, f"({len(short) - len(kept)} more modules)")
+    return "\n".join(kept)
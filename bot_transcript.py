@@ -0,0 +1,231 @@
+"""
+bot_transcript.py - Buffered, segmented transcript store with a lookup index
+
+Interactions are queued by the bot and written by a background thread into
+Markdown segments under `transcripts/` (one per day, rotated by size).
+Closed segments are compressed (zstd when the `zstandard` package is
+installed, otherwise gzip) and every record is listed in `index.jsonl`
+with its segment, offset, timestamp, actor and prompt hash.
+
+    python bot_transcript.py --actor Ollama --last 3
+"""
+import os
+import re
+import sys
+import gzip
+import json
+import queue
+import hashlib
+import argparse
+import datetime
+import threading
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+SEGMENT_RE = re.compile(r"^(\d{4}-\d{2}-\d{2})\.(\d{3})\.md$")
+
+def prompt_hash(text):
+    return hashlib.sha256(text.strip().encode('utf-8')).hexdigest()[:16]
+
+class TranscriptStore:
+    def __init__(self, directory="transcripts", max_segment_bytes=10 * 1024 * 1024,
+                 compress="gzip", flush_interval=1.0):
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self.compress = compress if compress in ("gzip", "zstd") else None
+        if self.compress == "zstd" and zstandard is None:
+            self.compress = "gzip"
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+        self.segment = None
+        self.handle = None
+        self.index = None
+        self.thread = None
+        os.makedirs(directory, exist_ok=True)
+
+    # --- Writer side ---
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.compress_finished()
+        self.index = open(os.path.join(self.directory, "index.jsonl"), "a", encoding="utf-8")
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+        self.thread.start()
+
+    def record(self, actor, input_text, output_text):
+        """Queue one interaction; never blocks on disk I/O."""
+        self.queue.put((datetime.datetime.now(), actor, input_text, output_text))
+
+    def close(self):
+        if self.thread is None:
+            return
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+        if self.handle:
+            self.handle.close()
+            self.handle = None
+            # Today's segment is resumed by the next start; older ones are done
+            if not self.segment.startswith(datetime.date.today().strftime("%Y-%m-%d")):
+                self.compress_segment(self.segment)
+        if self.index:
+            self.index.close()
+            self.index = None
+
+    def loop(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = [item]
+            # Drain whatever else is waiting so it goes out in one write
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            done = None in batch
+            try:
+                self.write_batch([b for b in batch if b is not None])
+            except OSError:
+                pass
+            if done:
+                return
+
+    def write_batch(self, batch):
+        for ts, actor, input_text, output_text in batch:
+            self.open_segment(ts)
+            stamp = ts.strftime("%Y-%m-%d %H:%M:%S")
+            text = (
+                f"\n## {stamp} - {actor}\n"
+                f"**Input/Prompt:**\n```\n{input_text.strip()}\n```\n"
+                f"**Output/Response:**\n```\n{output_text.strip()}\n```\n"
+                + "-" * 40 + "\n"
+            )
+            data = text.encode('utf-8')
+            offset = self.handle.tell()
+            self.handle.write(data)
+            self.index.write(json.dumps({
+                "segment": self.segment, "offset": offset, "length": len(data),
+                "ts": stamp, "actor": actor, "prompt_hash": prompt_hash(input_text),
+            }) + "\n")
+        if self.handle:
+            self.handle.flush()
+        self.index.flush()
+
+    def open_segment(self, ts):
+        day = ts.strftime("%Y-%m-%d")
+        if self.handle and self.segment.startswith(day) and self.handle.tell() < self.max_segment_bytes:
+            return
+        if self.handle:
+            self.handle.close()
+            self.compress_segment(self.segment)
+            self.handle = None
+
+        # Resume today's newest open segment, or start the next number
+        numbers = []
+        for name in os.listdir(self.directory):
+            base = name.split(".md")[0] + ".md"
+            match = SEGMENT_RE.match(base)
+            if match and match.group(1) == day:
+                numbers.append((int(match.group(2)), name == base))
+        number = max(numbers)[0] if numbers else 0
+        if numbers and not max(numbers)[1]:
+            number += 1  # latest one is already compressed
+        name = f"{day}.{number:03d}.md"
+        path = os.path.join(self.directory, name)
+        if os.path.exists(path) and os.path.getsize(path) >= self.max_segment_bytes:
+            self.compress_segment(name)
+            name = f"{day}.{number + 1:03d}.md"
+            path = os.path.join(self.directory, name)
+        self.segment = name
+        self.handle = open(path, "ab")
+
+    def compress_finished(self):
+        """Compress plain segments left from earlier days (the bot stopped
+        before rotating them)."""
+        today = datetime.date.today().strftime("%Y-%m-%d")
+        for name in sorted(os.listdir(self.directory)):
+            match = SEGMENT_RE.match(name)
+            if match and match.group(1) < today:
+                self.compress_segment(name)
+
+    def compress_segment(self, name):
+        if not self.compress:
+            return
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            if self.compress == "zstd":
+                with open(path + ".zst", "wb") as f:
+                    f.write(zstandard.ZstdCompressor().compress(data))
+            else:
+                with gzip.open(path + ".gz", "wb") as f:
+                    f.write(data)
+            os.remove(path)
+        except OSError:
+            pass
+
+    # --- Reader side ---
+
+    def entries(self, actor=None, prompt_hash_value=None, since=None):
+        path = os.path.join(self.directory, "index.jsonl")
+        if not os.path.exists(path):
+            return []
+        found = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if actor and not entry["actor"].startswith(actor):
+                    continue
+                if prompt_hash_value and entry["prompt_hash"] != prompt_hash_value:
+                    continue
+                if since and entry["ts"] < since:
+                    continue
+                found.append(entry)
+        return found
+
+    def read(self, entry):
+        """Return the Markdown text of one indexed record."""
+        base = os.path.join(self.directory, entry["segment"])
+        if os.path.exists(base):
+            with open(base, "rb") as f:
+                f.seek(entry["offset"])
+                data = f.read(entry["length"])
+        elif os.path.exists(base + ".gz"):
+            with gzip.open(base + ".gz", "rb") as f:
+                f.seek(entry["offset"])
+                data = f.read(entry["length"])
+        elif os.path.exists(base + ".zst") and zstandard is not None:
+            with open(base + ".zst", "rb") as f:
+                raw = zstandard.ZstdDecompressor().decompressobj().decompress(f.read())
+            data = raw[entry["offset"]:entry["offset"] + entry["length"]]
+        else:
+            return None
+        return data.decode('utf-8')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search the bot's transcript store")
+    parser.add_argument("--dir", default="transcripts")
+    parser.add_argument("--actor", help="actor prefix, e.g. Gemini or Ollama")
+    parser.add_argument("--prompt", help="exact prompt text to look up")
+    parser.add_argument("--since", help="YYYY-MM-DD[ HH:MM:SS]")
+    parser.add_argument("--last", type=int, default=10, help="show the N newest matches")
+    args = parser.parse_args(argv)
+
+    store = TranscriptStore(args.dir)
+    hash_value = prompt_hash(args.prompt) if args.prompt else None
+    for entry in store.entries(args.actor, hash_value, args.since)[-args.last:]:
+        sys.stdout.write(store.read(entry) or f"[missing segment {entry['segment']}]\n")
+
+if __name__ == "__main__":
+    main()
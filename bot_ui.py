@@ -3,10 +3,12 @@ bot_ui.py - Git Gardener V4 User Interface
 """
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
-import queue
 import threading
 import bot_core
 
+SCROLLBACK_LINES = 1000
+BATCH_LIMIT = 200
+
 class ModernApp:
     def __init__(self, root):
         self.root = root
@@ -15,6 +17,7 @@ class ModernApp:
         self.root.configure(bg="#1e1e1e")
         
         self.bot = bot_core.GitGardener()
+        self.log_sub = self.bot.log_bus.subscribe()
         self.setup_styles()
         self.create_widgets()
         
@@ -98,23 +101,33 @@ class ModernApp:
         self.log_area.tag_config("Error", foreground="#f44747")
         self.log_area.tag_config("CRITICAL", foreground="#f44747", background="#3c1e1e")
 
-    def log(self, role, message, time):
+    def log(self, entries, dropped=0):
+        """Append a batch of entries with one insert and one scroll."""
+        chunks = []
+        if dropped:
+            chunks += [f"... {dropped} messages skipped\n", "Time"]
+        for entry in entries:
+            chunks += [f"[{entry['time']}] ", "Time", f"{entry['role']}: ", entry["role"],
+                       f"{entry['message']}\n", ()]
         self.log_area.config(state='normal')
-        self.log_area.insert(tk.END, f"[{time}] ", "Time")
-        self.log_area.insert(tk.END, f"{role}: ", role)
-        self.log_area.insert(tk.END, f"{message}\n")
+        self.log_area.insert(tk.END, *chunks)
+        # Trim the scrollback so the widget doesn't grow for weeks
+        lines = int(self.log_area.index('end-1c').split('.')[0])
+        if lines > SCROLLBACK_LINES:
+            self.log_area.delete('1.0', f"{lines - SCROLLBACK_LINES}.0")
         self.log_area.see(tk.END)
         self.log_area.config(state='disabled')
 
     def update_ui(self):
-        # Process log queue
-        while not self.bot.log_queue.empty():
-            entry = self.bot.log_queue.get()
-            self.log(entry["role"], entry["message"], entry["time"])
-            
-            # Check for critical stop
-            if entry["message"] == "Bot Stopped":
-                self.set_stopped_state()
+        # Drain the log bus once per tick
+        dropped = self.log_sub.dropped
+        entries = self.log_sub.drain(BATCH_LIMIT)
+        if entries or self.log_sub.dropped > dropped:
+            self.log(entries, self.log_sub.dropped - dropped)
+
+        # Check for critical stop
+        if any(entry.get("event") == "stopped" for entry in entries):
+            self.set_stopped_state()
 
         # Update status visuals
         if self.bot.running:
@@ -0,0 +1,128 @@
+"""
+bot_validate.py - Checks generated Python files before they are committed
+"""
+import os
+import sys
+import ast
+import importlib.util
+
+# pyflakes findings that mean the file cannot work (the rest are style)
+FATAL_FLAKES = ("UndefinedName", "UndefinedExport", "UndefinedLocal", "DuplicateArgument",
+                "ReturnOutsideFunction", "YieldOutsideFunction", "ContinueOutsideLoop",
+                "BreakOutsideLoop")
+
+class _Collector:
+    def __init__(self):
+        self.messages = []
+
+    def flake(self, message):
+        self.messages.append(message)
+
+    def unexpectedError(self, filename, msg):
+        self.messages.append(msg)
+
+    def syntaxError(self, filename, msg, lineno, offset, text):
+        self.messages.append(f"line {lineno}: {msg}")
+
+def import_resolves(name, project_dir):
+    top = name.split(".")[0]
+    if not top or top in sys.builtin_module_names:
+        return True
+    if os.path.exists(os.path.join(project_dir, top + ".py")) or \
+            os.path.isdir(os.path.join(project_dir, top)):
+        return True
+    try:
+        return importlib.util.find_spec(top) is not None
+    except (ImportError, ValueError):
+        return False
+
+def check_file(path, strict_imports=False):
+    """Validate one file; runs in a worker process.
+
+    Returns {"errors": [...], "warnings": [...]}: syntax errors and fatal
+    pyflakes findings are errors; other pyflakes findings and imports
+    that resolve neither locally nor in this interpreter are warnings
+    (errors with `strict_imports`).
+    """
+    # Imported here, in the worker process, to keep the bot's startup light
+    try:
+        from pyflakes import api as pyflakes_api
+    except ImportError:
+        pyflakes_api = None
+    errors, warnings = [], []
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        source = f.read()
+    try:
+        tree = ast.parse(source, path)
+        compile(tree, path, "exec")
+    except SyntaxError as e:
+        return {"errors": [f"line {e.lineno}: {e.msg}"], "warnings": []}
+    except ValueError as e:  # e.g. null bytes
+        return {"errors": [str(e)], "warnings": []}
+
+    if pyflakes_api is not None:
+        collector = _Collector()
+        pyflakes_api.check(source, path, collector)
+        for message in collector.messages:
+            text = str(message).replace(path + ":", "line ", 1)
+            if type(message).__name__ in FATAL_FLAKES:
+                errors.append(text)
+            else:
+                warnings.append(text)
+
+    project_dir = os.path.dirname(os.path.abspath(path))
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and not node.level and node.module:
+            names = [node.module]
+        else:
+            continue
+        for name in names:
+            if not import_resolves(name, project_dir):
+                (errors if strict_imports else warnings).append(
+                    f"line {node.lineno}: cannot resolve import '{name}'")
+    return {"errors": errors, "warnings": warnings}
+
+class Validator:
+    """Runs `check_file` in a process pool so parsing large outputs never
+    holds the GIL of the pipeline threads."""
+
+    def __init__(self, processes=2, strict_imports=False, metrics=None):
+        self.processes = max(1, processes)
+        self.strict_imports = strict_imports
+        self.metrics = metrics
+        self.pool = None
+
+    def executor(self):
+        if self.pool is None:
+            import concurrent.futures
+            self.pool = concurrent.futures.ProcessPoolExecutor(self.processes)
+        return self.pool
+
+    @staticmethod
+    def applies(path):
+        return path.endswith(".py")
+
+    def validate(self, path, timeout=60):
+        """Blocking check of `path` (non-Python files always pass)."""
+        if not self.applies(path):
+            return {"errors": [], "warnings": []}
+        import concurrent.futures
+        future = self.executor().submit(check_file, path, self.strict_imports)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            return {"errors": ["validation timed out"], "warnings": []}
+
+    def record(self, result):
+        if self.metrics:
+            self.metrics.incr("validated")
+            if result["errors"]:
+                self.metrics.incr("validation_failures")
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
@@ -4,7 +4,6 @@ Git Gardener V4 - Launcher
 import tkinter as tk
 import os
 import sys
-import sv_ttk
 
 # Ensure we can import local modules
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -16,6 +15,7 @@ if __name__ == "__main__":
     
     # Try to apply sun valley theme if available, else standard
     try:
+        import sv_ttk
         sv_ttk.set_theme("dark")
     except:
         pass